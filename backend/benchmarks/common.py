@@ -0,0 +1,85 @@
+import json
+import os
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+async def asgi_request(app, method: str, url: str, body: dict | None = None,
+                       headers: dict | None = None) -> tuple[int, dict, bytes]:
+    """Один HTTP-запрос к ASGI-приложению в том же процессе, без сети и сторонних клиентов"""
+    parts = urlsplit(url)
+    payload = json.dumps(body).encode() if body is not None else b""
+    raw_headers = [(b"host", b"bench"), (b"content-length", str(len(payload)).encode())]
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode(), value.encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    sent = False
+    response = {"status": 0, "headers": {}, "body": bytearray()}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], bytes(response["body"])
+
+
+UNITS = {"ms": 1e3, "us": 1e6}
+
+
+def summarize(latencies: list[float], elapsed: float, unit: str = "ms") -> dict:
+    """p50/p99 в миллисекундах (или unit) и пропускная способность в запросах в секунду"""
+    if not latencies:
+        return {"count": 0, f"p50_{unit}": None, f"p99_{unit}": None, "rps": 0.0}
+    ordered = sorted(latencies)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * UNITS[unit]
+
+    return {
+        "count": len(ordered),
+        f"p50_{unit}": round(percentile(0.50), 3),
+        f"p99_{unit}": round(percentile(0.99), 3),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+async def timed(latencies: list[float], coro) -> tuple[int, dict, bytes]:
+    start = time.perf_counter()
+    result = await coro
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+def remove_db(name: str) -> None:
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        path = BACKEND_DIR / f"{name}.db{suffix}"
+        if path.exists():
+            os.remove(path)
@@ -0,0 +1,106 @@
+"""
+Сравнение профилей движка SQLite (DB_PROFILE) на эндпоинтах цен и сделок.
+
+Каждый профиль запускается в отдельном процессе со своей базой: N читателей
+опрашивают /api/resources/prices, параллельно M писателей проводят депозиты и снятия.
+
+    cd backend && python -m benchmarks.db_profiles --duration 10 --readers 16 --writers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BACKEND_DIR, asgi_request, remove_db, summarize, timed
+
+PROFILES = ("default", "tuned")
+
+
+async def run_workload(duration: float, readers: int, writers: int) -> dict:
+    from src.db import async_engine
+    from src.migrations import migrate
+    from src.main import app
+    from src.populate_db import main as populate_db
+
+    migrate()
+    populate_db()
+    _, _, body = await asgi_request(app, "POST", "/api/auth/login", {"login": "root", "password": "root"})
+    headers = {"X-Auth-Token": json.loads(body)["token"]}
+    await asgi_request(app, "POST", "/api/admin/update-balance", {"player": "dima", "new_balance": 50000}, headers)
+
+    price_latencies: list[float] = []
+    trade_latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def reader():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            status, _, _ = await timed(price_latencies, asgi_request(app, "GET", "/api/resources/prices"))
+            errors += status != 200
+
+    async def writer(index: int):
+        nonlocal errors
+        step = 0
+        while time.perf_counter() < deadline:
+            path = "/api/admin/deposit" if (step + index) % 2 else "/api/admin/withdraw"
+            trade = {"player": "dima", "resource": "Алмаз", "amount": 1}
+            status, _, _ = await timed(trade_latencies, asgi_request(app, "POST", path, trade, headers))
+            errors += status != 200
+            step += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reader() for _ in range(readers)), *(writer(i) for i in range(writers)))
+    elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    return {
+        "prices": summarize(price_latencies, elapsed),
+        "trades": summarize(trade_latencies, elapsed),
+        "errors": errors,
+    }
+
+
+def run_profile(profile: str, args) -> dict:
+    db_name = f"bench_profile_{profile}"
+    env = {**os.environ, "DB_PROFILE": profile, "DB_NAME": db_name}
+    command = [sys.executable, "-m", "benchmarks.db_profiles", "--worker",
+               "--duration", str(args.duration), "--readers", str(args.readers), "--writers", str(args.writers)]
+    try:
+        proc = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    finally:
+        remove_db(db_name)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES))
+    parser.add_argument("--json", help="Файл для результатов в JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = asyncio.run(run_workload(args.duration, args.readers, args.writers))
+        print(json.dumps(result))
+        return
+
+    results = {profile: run_profile(profile, args) for profile in args.profiles}
+    print(f"{'profile':<10} {'endpoint':<8} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'rps':>9} {'errors':>7}")
+    for profile, result in results.items():
+        for endpoint in ("prices", "trades"):
+            row = result[endpoint]
+            print(f"{profile:<10} {endpoint:<8} {row['count']:>7} {row['p50_ms']!s:>9} {row['p99_ms']!s:>9} "
+                  f"{row['rps']!s:>9} {result['errors']:>7}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Бенчмарк основных эндпоинтов через ASGI в том же процессе на заполненной базе SQLite.
+
+База создается заново генератором populate_db с заданными размерами (клиенты, ресурсы,
+строки истории) и детерминированным seed, затем каждый эндпоинт получает --requests запросов
+от --concurrency параллельных задач.
+
+    cd backend && python -m benchmarks.endpoints --clients 10000 --resources 50 --history 1000000 --json endpoints.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from benchmarks.common import asgi_request, remove_db, summarize, timed
+
+DB_NAME = "bench_endpoints"
+
+
+def seed_database(clients: int, resources: int, history: int, seed: int) -> list[str]:
+    """Заполняет пустую базу генератором populate_db; возвращает имена ресурсов"""
+    from src.migrations import migrate
+    from src.populate_db import populate_scale
+    from src.resources.service import ResourceService
+
+    migrate()
+    populate_scale(clients, resources, history // max(1, resources), seed)
+    return [resource.name for resource in ResourceService.all()]
+
+
+async def run_endpoints(args) -> dict:
+    from src.db import async_engine
+    from src.main import app
+    from src.resources.cache import market_cache
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    names = seed_database(args.clients, args.resources, args.history, args.seed)
+    seed_seconds = time.perf_counter() - started
+    players = [f"player{i:06d}" for i in range(args.clients)]
+
+    _, _, body = await asgi_request(app, "POST", "/api/auth/login", {"login": "root", "password": "root"})
+    admin = {"X-Auth-Token": json.loads(body)["token"]}
+    _, headers, _ = await asgi_request(app, "GET", "/api/resources/prices")
+    prices_etag = {"If-None-Match": headers["etag"]}
+
+    def trade():
+        return {"player": rng.choice(players), "resource": rng.choice(names), "amount": rng.randint(1, 8)}
+
+    # (имя, метод, путь, тело, заголовки, сбрасывать кэш версии рынка перед запросом)
+    cases = [
+        ("GET /prices", "GET", lambda: "/api/resources/prices", None, None, False),
+        ("GET /prices 304", "GET", lambda: "/api/resources/prices", None, prices_etag, False),
+        ("GET /prices uncached", "GET", lambda: "/api/resources/prices", None, None, True),
+        ("GET /history", "GET", lambda: f"/api/resources/{rng.choice(names)}/history?limit=100", None, None, False),
+        ("GET /history uncached", "GET", lambda: f"/api/resources/{rng.choice(names)}/history?limit=100",
+         None, None, True),
+        ("POST /public/deposit/earned", "POST", lambda: "/api/resources/public/deposit/earned",
+         lambda: {"resource": rng.choice(names), "add_amount": rng.randint(1, 1000)}, None, False),
+        ("POST /public/withdraw/cost", "POST", lambda: "/api/resources/public/withdraw/cost",
+         lambda: {"resource": rng.choice(names), "withdraw_amount": rng.randint(1, 1000)}, None, False),
+        ("POST /public/deposit/amount-for-money", "POST", lambda: "/api/resources/public/deposit/amount-for-money",
+         lambda: {"resource": rng.choice(names), "target_money": rng.uniform(1, 10000)}, None, False),
+        ("POST /public/withdraw/amount-for-money", "POST", lambda: "/api/resources/public/withdraw/amount-for-money",
+         lambda: {"resource": rng.choice(names), "available_money": rng.uniform(1, 10000)}, None, False),
+        ("POST /public/quotes", "POST", lambda: "/api/resources/public/quotes",
+         lambda: {"quantities": [1, 8, 64, 576]}, None, False),
+        ("POST /admin/deposit", "POST", lambda: "/api/admin/deposit", trade, admin, False),
+        ("POST /admin/withdraw", "POST", lambda: "/api/admin/withdraw", trade, admin, False),
+    ]
+
+    results = {}
+    for name, method, path, make_body, headers, uncached in cases:
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        latencies: list[float] = []
+        statuses: dict[str, int] = {}
+        per_task = max(1, args.requests // args.concurrency)
+
+        async def worker():
+            for _ in range(per_task):
+                if uncached:
+                    await market_cache.bump()
+                status, _, _ = await timed(latencies, asgi_request(
+                    app, method, path(), make_body() if make_body else None, headers))
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        # Для uncached время сброса кэша входит в elapsed, но не в задержки
+        results[name] = {**summarize(latencies, time.perf_counter() - start), "statuses": statuses}
+
+    await async_engine.dispose()
+    return {
+        "config": {
+            "clients": args.clients, "resources": args.resources, "history": args.history,
+            "requests": args.requests, "concurrency": args.concurrency, "seed": args.seed,
+            "db_profile": os.environ.get("DB_PROFILE", "tuned"), "trace_queries": args.trace_queries,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "endpoints": results,
+    }
+
+
+def print_table(result: dict) -> None:
+    print(f"{'endpoint':<42} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'rps':>9}  statuses")
+    for name, row in result["endpoints"].items():
+        print(f"{name:<42} {row['count']:>7} {row['p50_ms']!s:>9} {row['p99_ms']!s:>9} {row['rps']!s:>9}  "
+              f"{row['statuses']}")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--resources", type=int, default=50)
+    parser.add_argument("--history", type=int, default=1000000, help="Строк истории цен")
+    parser.add_argument("--requests", type=int, default=1000, help="Запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", help="Подстроки имен эндпоинтов для запуска")
+    parser.add_argument("--trace-queries", action="store_true",
+                        help="Запоминать места вызова запросов к БД (QUERY_BUDGET_TRACE), замедляет запросы")
+
+
+def run(args) -> dict:
+    # Настройки читаются при импорте src, поэтому база задается до него
+    os.environ["DB_NAME"] = DB_NAME
+    if args.trace_queries:
+        os.environ["QUERY_BUDGET_TRACE"] = "true"
+    remove_db(DB_NAME)
+    try:
+        return asyncio.run(run_endpoints(args))
+    finally:
+        remove_db(DB_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument("--json", help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_table(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Микробенчмарк функций ResourceCalculator по диапазонам запасов и количеств.
+
+Каждый случай замеряется пачками по --number вызовов; p50/p99 считаются по времени одного вызова в пачке.
+
+    cd backend && python -m benchmarks.kernels --json kernels.json
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import summarize
+from src.resources.calc import ResourceCalculator
+
+RESOURCE = "Алмаз"
+TOTAL_DOLLARS = 100000
+STOCKS = (10, 1000, 100000)
+QUANTITIES = (1, 64, 4096, 100000)
+
+
+def cases() -> list[tuple[str, callable]]:
+    calc = ResourceCalculator
+    result = []
+    for stock in STOCKS:
+        result.append((f"get_resource_price stock={stock}",
+                       lambda s=stock: calc.get_resource_price(RESOURCE, s, TOTAL_DOLLARS)))
+        for quantity in QUANTITIES:
+            result.append((f"calc_deposit_earned stock={stock} n={quantity}",
+                           lambda s=stock, q=quantity: calc.calc_deposit_earned(RESOURCE, s, q, TOTAL_DOLLARS)))
+            result.append((f"calc_withdraw_cost stock={stock} n={quantity}",
+                           lambda s=stock, q=quantity: calc.calc_withdraw_cost(RESOURCE, s, q, TOTAL_DOLLARS)))
+        for money in (100, 10000, 1000000):
+            result.append((f"calc_deposit_amount_for_money stock={stock} money={money}",
+                           lambda s=stock, m=money: calc.calc_deposit_amount_for_money(RESOURCE, s, m, TOTAL_DOLLARS)))
+            result.append((f"calc_withdraw_amount_for_money stock={stock} money={money}",
+                           lambda s=stock, m=money: calc.calc_withdraw_amount_for_money(RESOURCE, s, m, TOTAL_DOLLARS)))
+    stock = {name: 1000 for name in calc.DEFAULT_BASE_RATES}
+    result.append(("quote_grid resources=6 quantities=4",
+                   lambda: calc.quote_grid(stock, [1, 8, 64, 576], TOTAL_DOLLARS)))
+    return result
+
+
+def run_kernels(number: int, repeat: int) -> dict:
+    # Курсы по умолчанию вместо чтения из БД: замеряем только вычисления
+    ResourceCalculator.set_rates(0, dict(ResourceCalculator.DEFAULT_BASE_RATES))
+    results = {}
+    for name, func in cases():
+        latencies = []
+        elapsed = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            batch = time.perf_counter() - start
+            elapsed += batch
+            latencies.append(batch / number)
+        row = summarize(latencies, elapsed, unit="us")
+        row["count"] = number * repeat
+        row["rps"] = round(number * repeat / elapsed, 1)
+        results[name] = row
+    return results
+
+
+def print_table(results: dict) -> None:
+    print(f"{'case':<62} {'p50 us':>9} {'p99 us':>9} {'ops/s':>12}")
+    for name, row in results.items():
+        print(f"{name:<62} {row['p50_us']:>9.3f} {row['p99_us']:>9.3f} {row['rps']:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200, help="Вызовов в одной пачке")
+    parser.add_argument("--repeat", type=int, default=50, help="Число пачек")
+    parser.add_argument("--json", help="Файл для результатов в JSON")
+    args = parser.parse_args()
+
+    results = run_kernels(args.number, args.repeat)
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Полный набор бенчмарков: функции ResourceCalculator и эндпоинты API.
+
+Результаты пишутся одним JSON; --compare печатает изменение p50/p99 относительно прошлого прогона.
+
+    cd backend && python -m benchmarks.suite --json bench.json
+    cd backend && python -m benchmarks.suite --json bench-new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from benchmarks import endpoints, kernels
+from benchmarks.common import BACKEND_DIR
+
+
+def git_revision() -> str | None:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"{'case':<62} {'p50 было':>10} {'p50 стало':>10} {'Δ p50':>8} {'Δ p99':>8}")
+    for section, unit in (("kernels", "us"), ("endpoints", "ms")):
+        old_rows = baseline.get(section, {})
+        for name, row in current.get(section, {}).items():
+            old = old_rows.get(name)
+            if not old or not old.get(f"p50_{unit}") or not old.get(f"p99_{unit}"):
+                continue
+            p50_delta = row[f"p50_{unit}"] / old[f"p50_{unit}"] - 1
+            p99_delta = row[f"p99_{unit}"] / old[f"p99_{unit}"] - 1
+            print(f"{name:<62} {old[f'p50_{unit}']:>10} {row[f'p50_{unit}']:>10} "
+                  f"{p50_delta:>+8.1%} {p99_delta:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    endpoints.add_arguments(parser)
+    parser.add_argument("--number", type=int, default=200, help="Вызовов в одной пачке для функций")
+    parser.add_argument("--repeat", type=int, default=50, help="Число пачек для функций")
+    parser.add_argument("--skip", choices=["kernels", "endpoints"], help="Пропустить часть набора")
+    parser.add_argument("--json", help="Файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+    }
+    if args.skip != "kernels":
+        result["kernels"] = kernels.run_kernels(args.number, args.repeat)
+        kernels.print_table(result["kernels"])
+        print()
+    if args.skip != "endpoints":
+        endpoint_result = endpoints.run(args)
+        result["config"] = endpoint_result["config"]
+        result["endpoints"] = endpoint_result["endpoints"]
+        endpoints.print_table(endpoint_result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        compare(result, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,18 @@
 from fastapi import APIRouter, HTTPException, Security
+from typing import List
 from pydantic import BaseModel
-from src.resources.calc import ResourceCalculator
 from src.resources.schemas import ResourcePriceSchema
-from src.resources.service import ResourceService, ResourceHistoryService
-from src.clients.service import ClientBalanceService, BankAccountService
+from src.resources.service import AsyncResourceService
+from src.clients.service import AsyncClientBalanceService, AsyncBankAccountService
+from src.trade.schemas import TradeRequestSchema, TradeBatchResponse
+from src.trade.service import AsyncTradeService, TradeError
 from src.api.auth import get_current_user
+from src.user.cache import token_cache
+from src.resources.feed import price_feed
+from src.resources.cache import market_cache
+from src.resources.retention import compact_history
+from src.resources.snapshots import snapshot_writer
+from src.ledger.service import AsyncLedgerService
 
 router = APIRouter(
     prefix="/api/admin",
@@ -16,6 +24,9 @@ class TransactionRequest(BaseModel):
     resource: str
     amount: int
 
+class TradeBatchRequest(BaseModel):
+    trades: List[TradeRequestSchema]
+
 class UpdateBalanceRequest(BaseModel):
     player: str
     new_balance: float
@@ -40,147 +51,176 @@ class UpdateBankBalanceRequest(BaseModel):
     new_balance: float
 
 @router.post("/deposit")
-def deposit(request: TransactionRequest, user=Security(get_current_user)):
+async def deposit(request: TransactionRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может проводить транзакции")
-    client_db = ClientBalanceService.find_db(request.player)
-    resource_db = ResourceService.find_db(request.resource)
-    if not client_db or not resource_db:
-        raise HTTPException(status_code=404, detail="Клиент или ресурс не найден")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
-    earned = ResourceCalculator.calc_deposit_earned(resource_db.name, resource_db.amount, request.amount, total_dollars)
-    # Списываем деньги с банковского счета
-    BankAccountService.subtract_money(earned)
-    ResourceService.update(resource_id=resource_db.id, amount=resource_db.amount + request.amount)
-    ClientBalanceService.update(client_id=client_db.id, balance=client_db.balance + earned)
-    # Обновляем историю цен для всех ресурсов
-    updated_clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(updated_clients)
-    return {"status": "ok", "earned": earned, "commission": "5%"}
+    try:
+        trade = await AsyncTradeService.deposit(request.player, request.resource, request.amount)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
+    return {"status": "ok", "earned": trade.money, "commission": "5%"}
 
 @router.post("/withdraw")
-def withdraw(request: TransactionRequest, user=Security(get_current_user)):
+async def withdraw(request: TransactionRequest, user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может проводить транзакции")
+    try:
+        trade = await AsyncTradeService.withdraw(request.player, request.resource, request.amount)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
+    return {"status": "ok", "cost": trade.money, "commission": "0%"}
+
+@router.post("/trades/batch", response_model=TradeBatchResponse)
+async def trade_batch(request: TradeBatchRequest, user=Security(get_current_user)):
+    """Пакет сделок по порядку в одной транзакции: либо проходят все, либо ни одна"""
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может проводить транзакции")
-    client_db = ClientBalanceService.find_db(request.player)
-    resource_db = ResourceService.find_db(request.resource)
-    if not client_db or not resource_db:
-        raise HTTPException(status_code=404, detail="Клиент или ресурс не найден")
-    if resource_db.amount < request.amount:
-        raise HTTPException(status_code=400, detail="Недостаточно ресурса в банке")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
-    cost = ResourceCalculator.calc_withdraw_cost(resource_db.name, resource_db.amount, request.amount, total_dollars)
-    if client_db.balance < cost:
-        raise HTTPException(status_code=400, detail="Недостаточно $ на счёте")
-    # Добавляем деньги на банковский счет
-    BankAccountService.add_money(cost)
-    ResourceService.update(resource_id=resource_db.id, amount=resource_db.amount - request.amount)
-    ClientBalanceService.update(client_id=client_db.id, balance=client_db.balance - cost)
-    # Обновляем историю цен для всех ресурсов
-    updated_clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(updated_clients)
-    return {"status": "ok", "cost": cost, "commission": "0%"}
+    if not request.trades or len(request.trades) > 1000:  # Ограничиваем размер пакета
+        raise HTTPException(status_code=400, detail="В пакете должно быть от 1 до 1000 сделок")
+    try:
+        results = await AsyncTradeService.batch(request.trades)
+    except TradeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # Один снимок истории цен на весь пакет
+    await snapshot_writer.schedule()
+    return {"status": "ok", "results": results}
 
 @router.post("/update-balance")
-def update_balance(request: UpdateBalanceRequest, user=Security(get_current_user)):
+async def update_balance(request: UpdateBalanceRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может изменять балансы")
-    client_db = ClientBalanceService.find_db(request.player)
+    client_db = await AsyncClientBalanceService.find_db(request.player)
     if not client_db:
         raise HTTPException(status_code=404, detail="Клиент не найден")
     old_balance = client_db.balance
-    ClientBalanceService.update(client_db.id, request.new_balance)
-    # Обновляем историю цен для всех ресурсов
-    updated_clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(updated_clients)
+    await AsyncClientBalanceService.update(client_db.id, request.new_balance)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "player": request.player, "old_balance": old_balance, "new_balance": request.new_balance}
 
 @router.post("/update-resource-amount")
-def update_resource_amount(request: UpdateResourceAmountRequest, user=Security(get_current_user)):
+async def update_resource_amount(request: UpdateResourceAmountRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может изменять ресурсы")
-    resource_db = ResourceService.find_db(request.resource)
+    resource_db = await AsyncResourceService.find_db(request.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    ResourceService.update(resource_db.id, request.new_amount)
-    # Обновляем историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    await AsyncResourceService.update(resource_db.id, request.new_amount)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "resource": request.resource, "new_amount": request.new_amount}
 
 @router.post("/add-resource")
-def add_resource(request: AddResourceRequest, user=Security(get_current_user)):
+async def add_resource(request: AddResourceRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может добавлять ресурсы")
-    existing = ResourceService.find(request.name)
+    existing = await AsyncResourceService.find(request.name)
     if existing:
         raise HTTPException(status_code=400, detail="Ресурс уже существует")
-    # Добавить в калькулятор
-    ResourceCalculator.BASE_RATES[request.name] = request.base_rate
-    # Добавить в БД
+    # Добавить в БД вместе с курсом
     resource = ResourcePriceSchema(name=request.name, price=0, amount=request.amount)
-    ResourceService.add(resource)
-    # Обновляем историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    await AsyncResourceService.add(resource, base_rate=request.base_rate)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "resource": request.name, "amount": request.amount, "base_rate": request.base_rate}
 
 @router.delete("/delete-resource")
-def delete_resource(request: DeleteResourceRequest, user=Security(get_current_user)):
+async def delete_resource(request: DeleteResourceRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может удалять ресурсы")
-    resource_db = ResourceService.find_db(request.resource)
+    resource_db = await AsyncResourceService.find_db(request.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    # Удалить из калькулятора
-    if request.resource in ResourceCalculator.BASE_RATES:
-        del ResourceCalculator.BASE_RATES[request.resource]
-    # Удалить из БД
-    deleted_count = ResourceService.delete(resource_db.id)
+    # Удалить из БД вместе с курсом
+    deleted_count = await AsyncResourceService.delete(resource_db.id)
     if deleted_count == 0:
         raise HTTPException(status_code=500, detail="Ошибка при удалении ресурса из БД")
-    # Обновляем историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "deleted_resource": request.resource, "deleted_count": deleted_count}
 
 @router.get("/base-rates")
-def get_base_rates(user=Security(get_current_user)):
+async def get_base_rates(user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может просматривать курсы")
-    return {"base_rates": ResourceCalculator.BASE_RATES}
+    return {"base_rates": await AsyncResourceService.base_rates()}
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может просматривать статистику кэша")
+    return token_cache.stats()
+
+@router.get("/price-feed")
+async def get_price_feed_stats(user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может просматривать статистику рассылки цен")
+    return price_feed.stats()
+
+@router.get("/market-cache")
+async def get_market_cache_stats(user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может просматривать статистику кэша")
+    return market_cache.stats()
+
+@router.get("/snapshot-writer")
+async def get_snapshot_writer_stats(user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может просматривать статистику записи истории")
+    return snapshot_writer.stats()
+
+@router.post("/compact-history")
+async def run_history_compaction(user=Security(get_current_user)):
+    """Внеочередной проход хранения истории цен"""
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может запускать очистку истории")
+    return await compact_history()
+
+@router.get("/ledger/verify")
+async def verify_ledger(full: bool = False, user=Security(get_current_user)):
+    """Сверка балансов с журналом; full - проигрывать журнал с начала, без снимка"""
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может сверять журнал")
+    return await AsyncLedgerService.verify(full)
+
+@router.post("/ledger/snapshot")
+async def snapshot_ledger(user=Security(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Только админ может делать снимок журнала")
+    return await AsyncLedgerService.snapshot()
 
 @router.get("/bank-balance")
-def get_bank_balance(user=Security(get_current_user)):
+async def get_bank_balance(user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может просматривать баланс банка")
-    bank_account = BankAccountService.get()
+    bank_account = await AsyncBankAccountService.get()
     return {"balance": bank_account.balance}
 
 @router.post("/update-bank-balance")
-def update_bank_balance(request: UpdateBankBalanceRequest, user=Security(get_current_user)):
+async def update_bank_balance(request: UpdateBankBalanceRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может изменять баланс банка")
     if request.new_balance < 0:
         raise HTTPException(status_code=400, detail="Баланс банка не может быть отрицательным")
-    old_balance = BankAccountService.get().balance
-    BankAccountService.update(request.new_balance)
-    # Обновляем историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    old_balance = (await AsyncBankAccountService.get()).balance
+    await AsyncBankAccountService.update(request.new_balance)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "old_balance": old_balance, "new_balance": request.new_balance}
 
 @router.post("/update-base-rate")
-def update_base_rate(request: UpdateBaseRateRequest, user=Security(get_current_user)):
+async def update_base_rate(request: UpdateBaseRateRequest, user=Security(get_current_user)):
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Только админ может изменять курсы")
-    if request.resource not in ResourceCalculator.BASE_RATES:
+    resource_db = await AsyncResourceService.find_db(request.resource)
+    if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден в системе курсов")
-    old_rate = ResourceCalculator.BASE_RATES[request.resource]
-    ResourceCalculator.BASE_RATES[request.resource] = request.new_rate
-    # Обновляем историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    old_rate = resource_db.base_rate
+    await AsyncResourceService.update_base_rate(resource_db.id, request.new_rate)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "ok", "resource": request.resource, "old_rate": old_rate, "new_rate": request.new_rate}
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Security
 from fastapi.security import APIKeyHeader
 
 from src.user.schemas import UserFilterSchema, UserLoginSchema, UserUpdateSchema
-from src.user.service import UserService
+from src.user.service import AsyncUserService
+from src.user.cache import token_cache
 from src.user.token import generate_token
 
 router = APIRouter(
@@ -12,23 +13,28 @@ router = APIRouter(
 
 X_AUTH_TOKEN = APIKeyHeader(name="X-Auth-Token")
 
-def get_current_user(token: str = Security(X_AUTH_TOKEN)):
+async def get_current_user(token: str = Security(X_AUTH_TOKEN)):
     if not token:
         raise HTTPException(status_code=401, detail="Token missing")
 
-    user = UserService.find(UserFilterSchema(auth_token=token))
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    user = token_cache.get(token)
+    if user is None:
+        # Смена токена во время чтения из БД сбросит поколение, и прочитанный пользователь не попадет в кэш
+        generation = token_cache.generation
+        user = await AsyncUserService.find(UserFilterSchema(auth_token=token))
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        token_cache.put(token, user, generation)
 
     return user
 
 @router.post("/login")
-def login_user(user: UserLoginSchema):
-    ret = UserService.find(user)
+async def login_user(user: UserLoginSchema):
+    ret = await AsyncUserService.find(user)
     if ret is not None:
         token = generate_token()
         update_data = UserUpdateSchema(id=ret.id, auth_token=token)
-        UserService.update(update_data)
+        await AsyncUserService.update(update_data)
         return {"status": "ok", "token": token, "user_role": ret.role}
 
     return {"status": "wrong login or password", "token": None, "user_role": None}
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from src.clients.service import ClientBalanceService
+from src.clients.service import AsyncClientBalanceService
 from src.clients.schemas import AllClientBalancesResponse, ClientBalanceSchema
+from src.resources.snapshots import snapshot_writer
 from pydantic import BaseModel
+from typing import Literal
 
 router = APIRouter(
     prefix="/api/clients",
@@ -9,22 +11,30 @@ router = APIRouter(
 )
 
 @router.get("/balances", response_model=AllClientBalancesResponse)
-def get_client_balances():
-    clients = ClientBalanceService.all()
-    return {"clients": clients}
+async def get_client_balances(limit: int | None = None, cursor: str | None = None, prefix: str | None = None,
+                              sort: Literal["id", "name"] = "id"):
+    """Без limit возвращает всех клиентов; с limit - страницу и next_cursor для следующего запроса"""
+    if limit is not None and limit > 1000:  # Ограничиваем размер страницы
+        limit = 1000
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit должен быть положительным")
+    # isdigit() пропускает и не-ASCII цифры ("²"), которые int() не разбирает
+    if sort == "id" and cursor is not None and not (cursor.isascii() and cursor.isdigit()):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    clients, next_cursor = await AsyncClientBalanceService.page(limit, cursor, prefix, sort)
+    return {"clients": clients, "next_cursor": next_cursor}
 
 class RegisterCardRequest(BaseModel):
     name: str
     initial_amount: float = 50
 
 @router.post("/register")
-def register_card(request: RegisterCardRequest):
-    if ClientBalanceService.find(request.name):
+async def register_card(request: RegisterCardRequest):
+    if await AsyncClientBalanceService.find(request.name):
         return {"status": "already exists"}
     client = ClientBalanceSchema(name=request.name, balance=request.initial_amount)
-    ClientBalanceService.add(client)
-    # Обновляем историю цен для всех ресурсов
-    from src.resources.service import ResourceHistoryService
-    updated_clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(updated_clients)
+    # Новый баланс меняет денежную массу, а значит и цены: версия рынка растет в той же транзакции
+    await AsyncClientBalanceService.add(client)
+    # Планируем снимок истории цен для всех ресурсов
+    await snapshot_writer.schedule()
     return {"status": "created", "name": request.name, "balance": request.initial_amount} 
\ No newline at end of file
@@ -1,32 +1,112 @@
-from fastapi import APIRouter, HTTPException
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from src.resources.calc import ResourceCalculator
-from src.resources.schemas import AllResourcePricesResponse, ResourcePriceSchema, ResourcePriceHistoryResponse
-from src.resources.service import ResourceService, ResourceHistoryService
-from src.clients.service import ClientBalanceService, BankAccountService
+from src.resources.schemas import (
+    AllResourcePricesResponse, ResourcePriceHistoryResponse, ResourceCandlesResponse,
+    ResourceQuotesResponse,
+)
+from src.resources.service import AsyncMarketService, AsyncResourceService, AsyncResourceHistoryService
+from src.resources.feed import price_feed
+from src.resources.cache import market_cache
 from pydantic import BaseModel
-from typing import List
+from typing import List, Literal
 
 router = APIRouter(
     prefix="/api/resources",
     tags=["Ресурсы"]
 )
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+async def _cached_response(request: Request, key: tuple, build) -> Response:
+    """Отдает ответ из кэша версии рынка; если у клиента актуальная версия - 304 без тела"""
+    version, etag = await market_cache.current()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = market_cache.get(key, version)
+    if body is None:
+        body = (await build()).model_dump_json().encode()
+        market_cache.put(key, version, body)
+    return Response(body, media_type="application/json", headers=headers)
+
 @router.get("/prices", response_model=AllResourcePricesResponse)
-def get_resource_prices():
-    resources = ResourceService.all()
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
-    result: List[ResourcePriceSchema] = []
-    for res in resources:
-        price = ResourceCalculator.get_resource_price(res.name, res.amount, total_dollars)
-        result.append(ResourcePriceSchema(name=res.name, price=price, amount=res.amount))
-    return {"resources": result}
+async def get_resource_prices(request: Request):
+    async def build():
+        return AllResourcePricesResponse(resources=await AsyncResourceService.prices())
+    return await _cached_response(request, ("prices",), build)
+
+@router.get("/stream")
+async def stream_resource_prices():
+    """
+    Server-Sent Events: кадр "prices" с ценами всех ресурсов после каждого изменения рынка.
+    Первым приходит текущее состояние.
+    """
+    if price_feed.last_frame is None:
+        prices = await AsyncResourceService.prices()
+        price_feed.publish([res.model_dump() for res in prices], datetime.now(timezone.utc).replace(tzinfo=None))
+    return StreamingResponse(
+        price_feed.subscribe(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _to_utc(value: datetime | None) -> datetime | None:
+    # История хранится в UTC без часового пояса
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def _ndjson_chunks(partitions):
+    async for rows in partitions:
+        yield "".join(
+            json.dumps({"id": row.id, "resource_name": row.resource_name, "price": row.price,
+                        "timestamp": row.timestamp.isoformat()}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+async def _csv_chunks(partitions):
+    yield "id,resource_name,price,timestamp\r\n"
+    async for rows in partitions:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows((row.id, row.resource_name, row.price, row.timestamp.isoformat()) for row in rows)
+        yield buffer.getvalue()
+
+@router.get("/history/export")
+async def export_resource_history(format: Literal["ndjson", "csv"] = "ndjson", resource: str | None = None,
+                                  after_id: int = 0, since: datetime | None = None, limit: int | None = None):
+    """
+    Потоковая выгрузка истории цен по возрастанию id. Для продолжения передайте
+    последний полученный id в after_id.
+    """
+    partitions = AsyncResourceHistoryService.stream_price_history(resource, after_id, _to_utc(since), limit)
+    if format == "csv":
+        return StreamingResponse(_csv_chunks(partitions), media_type="text/csv")
+    return StreamingResponse(_ndjson_chunks(partitions), media_type="application/x-ndjson")
 
 @router.get("/{resource}/history", response_model=ResourcePriceHistoryResponse)
-def get_resource_history(resource: str, limit: int = 20):
+async def get_resource_history(request: Request, resource: str, limit: int = 20):
     if limit > 100:  # Ограничиваем максимальное количество записей
         limit = 100
-    return ResourceHistoryService.get_price_history(resource, limit)
+    return await _cached_response(
+        request, ("history", resource, limit),
+        lambda: AsyncResourceHistoryService.get_price_history(resource, limit),
+    )
+
+@router.get("/{resource}/candles", response_model=ResourceCandlesResponse)
+async def get_resource_candles(resource: str, interval: Literal["1m", "1h", "1d"] = "1h",
+                               from_: datetime | None = Query(None, alias="from"), to: datetime | None = None,
+                               limit: int = 500):
+    if limit > 1000:  # Ограничиваем максимальное количество свечей
+        limit = 1000
+    return await AsyncResourceHistoryService.get_candles(resource, interval, _to_utc(from_), _to_utc(to), limit)
 
 class CalcDepositEarnedRequest(BaseModel):
     resource: str
@@ -44,68 +124,79 @@ class CalcWithdrawAmountForMoneyRequest(BaseModel):
     resource: str
     available_money: float
 
+class CalcQuotesRequest(BaseModel):
+    quantities: List[int]
+    resources: List[str] | None = None  # None - все ресурсы
+
 @router.post("/public/deposit/earned")
-def calc_deposit_earned(data: CalcDepositEarnedRequest):
-    resource_db = ResourceService.find_db(data.resource)
+async def calc_deposit_earned(data: CalcDepositEarnedRequest):
+    resource_db = await AsyncResourceService.find_db(data.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
+    total_dollars = await ResourceCalculator.get_total_dollars_async()
     earned = ResourceCalculator.calc_deposit_earned(
         data.resource, resource_db.amount, data.add_amount, total_dollars
     )
     return {"earned": earned, "commission": "5%"}
 
 @router.post("/public/deposit/amount-for-money")
-def calc_deposit_amount_for_money(data: CalcDepositAmountForMoneyRequest):
-    resource_db = ResourceService.find_db(data.resource)
+async def calc_deposit_amount_for_money(data: CalcDepositAmountForMoneyRequest):
+    resource_db = await AsyncResourceService.find_db(data.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
-    # Найти минимальное n, при котором сумма >= target_money
-    n = 0
-    money = 0
-    while money < data.target_money:
-        n += 1
-        money = ResourceCalculator.calc_deposit_earned(
-            data.resource, resource_db.amount, n, total_dollars
-        )
-        if n > 100000:  # safety limit
-            break
+    total_dollars = await ResourceCalculator.get_total_dollars_async()
+    n, money = ResourceCalculator.calc_deposit_amount_for_money(
+        data.resource, resource_db.amount, data.target_money, total_dollars
+    )
     return {"needed_amount": n, "money": money}
 
 @router.post("/public/withdraw/cost")
-def calc_withdraw_cost(data: CalcWithdrawCostRequest):
-    resource_db = ResourceService.find_db(data.resource)
+async def calc_withdraw_cost(data: CalcWithdrawCostRequest):
+    resource_db = await AsyncResourceService.find_db(data.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
+    total_dollars = await ResourceCalculator.get_total_dollars_async()
     cost = ResourceCalculator.calc_withdraw_cost(
         data.resource, resource_db.amount, data.withdraw_amount, total_dollars
     )
     return {"cost": cost, "commission": "0%"}
 
 @router.post("/public/withdraw/amount-for-money")
-def calc_withdraw_amount_for_money(data: CalcWithdrawAmountForMoneyRequest):
-    resource_db = ResourceService.find_db(data.resource)
+async def calc_withdraw_amount_for_money(data: CalcWithdrawAmountForMoneyRequest):
+    resource_db = await AsyncResourceService.find_db(data.resource)
     if not resource_db:
         raise HTTPException(status_code=404, detail="Ресурс не найден")
-    clients = ClientBalanceService.all()
-    total_dollars = ResourceCalculator.get_total_dollars(clients)
-    # Найти максимальное n, при котором стоимость <= available_money
-    n = 0
-    cost = 0
-    while True:
-        n += 1
-        cost = ResourceCalculator.calc_withdraw_cost(
-            data.resource, resource_db.amount, n, total_dollars
-        )
-        if cost > data.available_money or n > resource_db.amount or n > 100000:
-            n -= 1
-            cost = ResourceCalculator.calc_withdraw_cost(
-                data.resource, resource_db.amount, n, total_dollars
-            )
-            break
-    return {"max_amount": n, "cost": cost} 
\ No newline at end of file
+    total_dollars = await ResourceCalculator.get_total_dollars_async()
+    n, cost = ResourceCalculator.calc_withdraw_amount_for_money(
+        data.resource, resource_db.amount, data.available_money, total_dollars
+    )
+    return {"max_amount": n, "cost": cost} 
+
+@router.post("/public/quotes", response_model=ResourceQuotesResponse)
+async def calc_quotes(data: CalcQuotesRequest):
+    """Котировки депозита и снятия для каждого ресурса и каждого количества по одному снимку рынка"""
+    if not data.quantities or len(data.quantities) > 64:  # Ограничиваем размер сетки
+        raise HTTPException(status_code=400, detail="Укажите от 1 до 64 количеств")
+    if min(data.quantities) < 0:
+        raise HTTPException(status_code=400, detail="Количество не может быть отрицательным")
+    # Запасы и денежная масса читаются в одной транзакции, иначе сделка между чтениями сдвинет сетку
+    stock, total_dollars = await AsyncMarketService.stock()
+    total_dollars = int(total_dollars)
+    if data.resources is not None:
+        missing = [name for name in data.resources if name not in stock]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Ресурс не найден: {', '.join(missing)}")
+        stock = {name: stock[name] for name in data.resources}
+    grid = ResourceCalculator.quote_grid(stock, data.quantities, total_dollars)
+    return {
+        "quantities": data.quantities,
+        "quotes": [
+            {
+                "name": name,
+                "price": ResourceCalculator.get_resource_price(name, amount, total_dollars),
+                "amount": amount,
+                "deposit_earned": grid[name]["deposit"],
+                "withdraw_cost": grid[name]["withdraw"],
+            } for name, amount in stock.items()
+        ],
+    }
@@ -13,3 +13,9 @@ class BankAccountOrm(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     balance: Mapped[float] = mapped_column(default=50000.0)  # Измените это значение на нужное
+
+class MoneySupplyOrm(Base):
+    __tablename__ = "money_supply"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    total: Mapped[float]  # Банковский счет + все клиентские балансы
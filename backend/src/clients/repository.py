@@ -1,6 +1,10 @@
-from sqlalchemy import select, update
-from src.clients.models import ClientBalanceOrm, BankAccountOrm
-from src.db import Session_maker
+from sqlalchemy import Connection, Row, exists, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from src.clients.models import ClientBalanceOrm, BankAccountOrm, MoneySupplyOrm
+from src.db import Session_maker, Async_session_maker, begin_write, begin_write_async
+from src.ledger.repository import LedgerRepository
+from src.resources.repository import MarketStateRepository
 
 class ClientBalanceRepository:
     @classmethod
@@ -8,6 +12,10 @@ class ClientBalanceRepository:
         with Session_maker() as session:
             new_client = ClientBalanceOrm(**value)
             session.add(new_client)
+            session.flush()
+            MoneySupplyRepository.shift(session, new_client.balance)
+            LedgerRepository.append(session, "register", player=new_client.name, client_delta=new_client.balance)
+            MarketStateRepository.bump(session)
             session.commit()
             session.refresh(new_client)
             return new_client
@@ -26,34 +34,211 @@ class ClientBalanceRepository:
             result = session.scalars(query)
             return result.all()
 
+    @classmethod
+    def exists(cls) -> bool:
+        """Есть ли хотя бы один клиент: EXISTS останавливается на первой строке"""
+        with Session_maker() as session:
+            return session.scalar(select(exists().select_from(ClientBalanceOrm)))
+
     @classmethod
     def update(cls, client_id: int, value: dict) -> int:
         with Session_maker() as session:
+            if "balance" in value:
+                ClientBalanceRepository.record_edit(session, client_id, value["balance"])
             query = update(ClientBalanceOrm).where(ClientBalanceOrm.id == client_id).values(**value)
             ret = session.execute(query)
             session.commit()
             return ret.rowcount
 
+    @staticmethod
+    def record_edit(session: Session, client_id: int, balance: float) -> None:
+        """Сдвиг денежной массы, запись журнала и новая версия рынка для правки баланса, до самого UPDATE"""
+        old_balance = select(ClientBalanceOrm.balance).where(ClientBalanceOrm.id == client_id).scalar_subquery()
+        name = select(ClientBalanceOrm.name).where(ClientBalanceOrm.id == client_id).scalar_subquery()
+        delta = balance - func.coalesce(old_balance, balance)
+        MoneySupplyRepository.shift(session, delta)
+        LedgerRepository.append(session, "balance_edit", player=name, client_delta=delta)
+        MarketStateRepository.bump(session)
+
 class BankAccountRepository:
     @classmethod
     def get(cls) -> BankAccountOrm:
         with Session_maker() as session:
-            query = select(BankAccountOrm)
-            result = session.scalar(query)
-            if not result:
-                # Создаем банковский счет если его нет
-                bank_account = BankAccountOrm()
-                session.add(bank_account)
-                session.commit()
-                session.refresh(bank_account)
-                return bank_account
-            return result
+            bank_account = cls.load(session)
+            session.commit()
+            return bank_account
+
+    @staticmethod
+    def load(session: Session) -> BankAccountOrm:
+        """Банковский счет в транзакции вызывающего (создается, если его нет)"""
+        query = select(BankAccountOrm)
+        result = session.scalar(query)
+        if not result:
+            # Создаем банковский счет если его нет
+            bank_account = BankAccountOrm()
+            session.add(bank_account)
+            session.flush()
+            MoneySupplyRepository.shift(session, bank_account.balance)
+            LedgerRepository.append(session, "bank_open", bank_delta=bank_account.balance)
+            MarketStateRepository.bump(session)
+            return bank_account
+        return result
 
     @classmethod
     def update(cls, value: dict) -> int:
         with Session_maker() as session:
-            bank_account = cls.get()
+            # Баланс читается для дельты журнала, поэтому блокировка на запись берется до чтения
+            begin_write(session)
+            bank_account = cls.load(session)
+            if "balance" in value:
+                cls.record_edit(session, bank_account.id, value["balance"])
             query = update(BankAccountOrm).where(BankAccountOrm.id == bank_account.id).values(**value)
             ret = session.execute(query)
             session.commit()
             return ret.rowcount
+
+    @staticmethod
+    def record_edit(session: Session, account_id: int, balance: float) -> None:
+        old_balance = select(BankAccountOrm.balance).where(BankAccountOrm.id == account_id).scalar_subquery()
+        delta = balance - func.coalesce(old_balance, balance)
+        MoneySupplyRepository.shift(session, delta)
+        LedgerRepository.append(session, "bank_edit", bank_delta=delta)
+        MarketStateRepository.bump(session)
+
+class MoneySupplyRepository:
+    """Поддерживаемый агрегат денежной массы, обновляется в транзакции каждого изменения балансов"""
+
+    @classmethod
+    def get(cls) -> float:
+        with Session_maker() as session:
+            total = cls.read(session)
+            session.commit()
+            return total
+
+    @classmethod
+    def read(cls, session: Session) -> float:
+        """Денежная масса в транзакции вызывающего; только чтение"""
+        total = session.scalar(select(MoneySupplyOrm.total))
+        if total is None:
+            # Строку создает миграция; до нее считаем сумму по таблицам балансов, ничего не записывая
+            total = session.scalar(select(cls.computed_total()))
+        return total
+
+    @staticmethod
+    def computed_total():
+        """Сумма банковского счета и всех клиентских балансов по таблицам (SQL-выражение)"""
+        clients_total = select(func.coalesce(func.sum(ClientBalanceOrm.balance), 0)).scalar_subquery()
+        bank_total = select(func.coalesce(func.sum(BankAccountOrm.balance), 0)).scalar_subquery()
+        return clients_total + bank_total
+
+    @staticmethod
+    def rebuild(session: Session) -> float:
+        total = session.scalar(select(MoneySupplyRepository.computed_total()))
+        supply = session.merge(MoneySupplyOrm(id=1, total=total))
+        return supply.total
+
+    @staticmethod
+    def ensure(conn: Connection) -> None:
+        """Создает строку агрегата по текущим балансам, если ее нет (миграция)"""
+        conn.execute(
+            sqlite_insert(MoneySupplyOrm)
+            .from_select(["id", "total"], select(1, MoneySupplyRepository.computed_total()))
+            .on_conflict_do_nothing()
+        )
+
+    @staticmethod
+    def shift(session: Session, delta) -> None:
+        """Сдвигает агрегат на delta (число или SQL-выражение) в транзакции вызывающего"""
+        session.execute(update(MoneySupplyOrm).values(total=MoneySupplyOrm.total + delta))
+
+class AsyncClientBalanceRepository:
+    @classmethod
+    async def add(cls, value: dict) -> ClientBalanceOrm:
+        async with Async_session_maker() as session:
+            new_client = ClientBalanceOrm(**value)
+            session.add(new_client)
+            await session.flush()
+            await session.run_sync(MoneySupplyRepository.shift, new_client.balance)
+            await session.run_sync(
+                LedgerRepository.append, "register", player=new_client.name, client_delta=new_client.balance
+            )
+            await session.run_sync(MarketStateRepository.bump)
+            await session.commit()
+            await session.refresh(new_client)
+            return new_client
+
+    @classmethod
+    async def find(cls, filter_by: dict) -> ClientBalanceOrm:
+        async with Async_session_maker() as session:
+            query = select(ClientBalanceOrm).filter_by(**filter_by)
+            result = await session.scalar(query)
+            return result
+
+    @classmethod
+    async def all(cls) -> list[ClientBalanceOrm]:
+        async with Async_session_maker() as session:
+            query = select(ClientBalanceOrm)
+            result = await session.scalars(query)
+            return result.all()
+
+    @classmethod
+    async def page(cls, limit: int | None = None, after_id: int | None = None, after_name: str | None = None,
+                   prefix: str | None = None, order_by_name: bool = False) -> list[Row]:
+        """Строки (id, name, balance) без загрузки ORM-объектов, с keyset-пагинацией по id или имени"""
+        query = select(ClientBalanceOrm.id, ClientBalanceOrm.name, ClientBalanceOrm.balance)
+        if prefix:
+            # Диапазон по уникальному индексу name вместо LIKE, который индекс не использует
+            query = query.where(ClientBalanceOrm.name >= prefix)
+            if ord(prefix[-1]) < 0x10FFFF:
+                query = query.where(ClientBalanceOrm.name < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if order_by_name:
+            if after_name is not None:
+                query = query.where(ClientBalanceOrm.name > after_name)
+            query = query.order_by(ClientBalanceOrm.name)
+        else:
+            if after_id is not None:
+                query = query.where(ClientBalanceOrm.id > after_id)
+            query = query.order_by(ClientBalanceOrm.id)
+        if limit is not None:
+            query = query.limit(limit)
+        async with Async_session_maker() as session:
+            result = await session.execute(query)
+            return result.all()
+
+    @classmethod
+    async def update(cls, client_id: int, value: dict) -> int:
+        async with Async_session_maker() as session:
+            if "balance" in value:
+                await session.run_sync(ClientBalanceRepository.record_edit, client_id, value["balance"])
+            query = update(ClientBalanceOrm).where(ClientBalanceOrm.id == client_id).values(**value)
+            ret = await session.execute(query)
+            await session.commit()
+            return ret.rowcount
+
+class AsyncBankAccountRepository:
+    @classmethod
+    async def get(cls) -> BankAccountOrm:
+        async with Async_session_maker() as session:
+            bank_account = await session.run_sync(BankAccountRepository.load)
+            await session.commit()
+            return bank_account
+
+    @classmethod
+    async def update(cls, value: dict) -> int:
+        async with Async_session_maker() as session:
+            await begin_write_async(session)
+            bank_account = await session.run_sync(BankAccountRepository.load)
+            if "balance" in value:
+                await session.run_sync(BankAccountRepository.record_edit, bank_account.id, value["balance"])
+            query = update(BankAccountOrm).where(BankAccountOrm.id == bank_account.id).values(**value)
+            ret = await session.execute(query)
+            await session.commit()
+            return ret.rowcount
+
+class AsyncMoneySupplyRepository:
+    @classmethod
+    async def get(cls) -> float:
+        async with Async_session_maker() as session:
+            total = await session.run_sync(MoneySupplyRepository.read)
+            await session.commit()
+            return total
@@ -6,6 +6,7 @@ class ClientBalanceSchema(BaseModel):
 
 class AllClientBalancesResponse(BaseModel):
     clients: list[ClientBalanceSchema]
+    next_cursor: str | None = None
 
 class BankAccountSchema(BaseModel):
     balance: float
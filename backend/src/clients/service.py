@@ -1,6 +1,9 @@
-from src.clients.repository import ClientBalanceRepository, BankAccountRepository
+from src.clients.repository import (
+    ClientBalanceRepository, BankAccountRepository, MoneySupplyRepository,
+    AsyncClientBalanceRepository, AsyncBankAccountRepository, AsyncMoneySupplyRepository,
+)
 from src.clients.schemas import ClientBalanceSchema, BankAccountSchema
-from src.clients.models import ClientBalanceOrm, BankAccountOrm
+from src.clients.models import ClientBalanceOrm
 from typing import List
 
 class ClientBalanceService:
@@ -25,6 +28,10 @@ class ClientBalanceService:
     def all(cls) -> List[ClientBalanceSchema]:
         return [ClientBalanceSchema(name=elem.name, balance=elem.balance) for elem in ClientBalanceRepository.all()]
 
+    @classmethod
+    def exists(cls) -> bool:
+        return ClientBalanceRepository.exists()
+
     @classmethod
     def update(cls, client_id: int, balance: float) -> int:
         return ClientBalanceRepository.update(client_id, {"balance": balance})
@@ -52,3 +59,67 @@ class BankAccountService:
         if current.balance < amount:
             raise ValueError(f"Недостаточно средств в банке. Доступно: {current.balance}, требуется: {amount}")
         return cls.update(current.balance - amount)
+
+class MoneySupplyService:
+    @classmethod
+    def total(cls) -> float:
+        """Денежная масса рынка: банковский счет и все клиентские балансы"""
+        return MoneySupplyRepository.get()
+
+class AsyncClientBalanceService:
+    @classmethod
+    async def add(cls, client: ClientBalanceSchema) -> ClientBalanceSchema:
+        value = client.model_dump()
+        db_client = await AsyncClientBalanceRepository.add(value)
+        return ClientBalanceSchema(name=db_client.name, balance=db_client.balance)
+
+    @classmethod
+    async def find(cls, name: str) -> ClientBalanceSchema | None:
+        db_client = await AsyncClientBalanceRepository.find({"name": name})
+        if db_client:
+            return ClientBalanceSchema(name=db_client.name, balance=db_client.balance)
+        return None
+
+    @classmethod
+    async def find_db(cls, name: str) -> ClientBalanceOrm | None:
+        return await AsyncClientBalanceRepository.find({"name": name})
+
+    @classmethod
+    async def all(cls) -> List[ClientBalanceSchema]:
+        return [ClientBalanceSchema(name=elem.name, balance=elem.balance) for elem in await AsyncClientBalanceRepository.all()]
+
+    @classmethod
+    async def page(cls, limit: int | None = None, cursor: str | None = None, prefix: str | None = None,
+                   sort: str = "id") -> tuple[list[dict], str | None]:
+        """Страница балансов в виде словарей и курсор следующей страницы (None - страниц больше нет)"""
+        order_by_name = sort == "name"
+        after_id = int(cursor) if cursor is not None and not order_by_name else None
+        # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = await AsyncClientBalanceRepository.page(
+            limit + 1 if limit is not None else None, after_id, cursor, prefix, order_by_name
+        )
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1].name if order_by_name else str(rows[-1].id)
+        return [{"name": row.name, "balance": row.balance} for row in rows], next_cursor
+
+    @classmethod
+    async def update(cls, client_id: int, balance: float) -> int:
+        return await AsyncClientBalanceRepository.update(client_id, {"balance": balance})
+
+class AsyncBankAccountService:
+    @classmethod
+    async def get(cls) -> BankAccountSchema:
+        db_account = await AsyncBankAccountRepository.get()
+        return BankAccountSchema(balance=db_account.balance)
+
+    @classmethod
+    async def update(cls, balance: float) -> int:
+        return await AsyncBankAccountRepository.update({"balance": balance})
+
+class AsyncMoneySupplyService:
+    @classmethod
+    async def total(cls) -> float:
+        """Денежная масса рынка: банковский счет и все клиентские балансы"""
+        return await AsyncMoneySupplyRepository.get()
@@ -5,6 +5,8 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_PATH = Path("/db")
+# Асинхронные драйверы для DB_ENGINE
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
 
 class Settings(BaseSettings):
     DB_NAME: str = "DefaultValue"
@@ -12,10 +14,85 @@ class Settings(BaseSettings):
 
     MODE: str = "DefaultValue"
 
+    # Профиль движка SQLite: "tuned" применяет PRAGMA ниже при подключении, "default" оставляет настройки драйвера
+    DB_PROFILE: str = "tuned"
+    DB_JOURNAL_MODE: str = "WAL"
+    DB_SYNCHRONOUS: str = "NORMAL"
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_CACHE_SIZE: int = -64000  # Отрицательное значение - размер в КиБ
+    DB_TEMP_STORE: str = "MEMORY"
+    # Пул соединений (на каждый движок: синхронный и асинхронный)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+
+    # Кэш токенов авторизации: время жизни записи (сек) и максимальный размер.
+    # Кэш у каждого воркера свой, поэтому TTL - это и наибольшая задержка, с которой остальные воркеры
+    # перестают принимать замененный токен или видят новую роль
+    AUTH_CACHE_TTL: float = 5
+    AUTH_CACHE_SIZE: int = 1024
+
+    # Кэш ответов /prices и /history по версии рынка: максимальное число закэшированных ответов
+    MARKET_CACHE_SIZE: int = 256
+
+    # Поток цен /stream: как часто (сек) воркер с подписчиками сверяет общую версию рынка в БД,
+    # чтобы рассылать изменения, сделанные другими воркерами; 0 - только изменения своего процесса
+    PRICE_FEED_POLL_SECONDS: float = 1
+
+    # Окно сворачивания снимков истории цен (мс): изменения рынка за окно пишутся одним снимком в фоне;
+    # 0 - писать снимок сразу в обработчике
+    SNAPSHOT_COALESCE_MS: float = 500
+
+    # Снимки журнала балансов: перестроение проекций проигрывает только записи после последнего снимка.
+    # Фоновая задача раз в LEDGER_SNAPSHOT_INTERVAL_SECONDS делает снимок, когда хвост журнала
+    # длиннее LEDGER_SNAPSHOT_MIN_ENTRIES
+    LEDGER_SNAPSHOT_ENABLED: bool = True
+    LEDGER_SNAPSHOT_INTERVAL_SECONDS: float = 600
+    LEDGER_SNAPSHOT_MIN_ENTRIES: int = 10000
+    LEDGER_SNAPSHOT_KEEP: int = 2
+
+    # Хранение истории цен: сырые точки и минутные свечи старше срока удаляются фоновой задачей,
+    # часовые и дневные свечи (дополняются при каждом снимке) остаются
+    HISTORY_RETENTION_DAYS: float = 30
+    CANDLE_1M_RETENTION_DAYS: float = 7
+    COMPACTION_ENABLED: bool = True
+    COMPACTION_INTERVAL_SECONDS: float = 3600
+    COMPACTION_BATCH_SIZE: int = 5000  # Строк на одну короткую транзакцию удаления
+    COMPACTION_VACUUM_PAGES: int = 1000  # Страниц на один шаг PRAGMA incremental_vacuum
+
+    # Метрики /metrics и заголовок Server-Timing
+    METRICS_ENABLED: bool = True
+    # Запоминать места вызова запросов к БД, чтобы при превышении бюджета маршрута писать их в лог.
+    # Разбор стека на каждый запрос дорог, поэтому включается только в тестах и бенчмарках
+    QUERY_BUDGET_TRACE: bool = False
+    # Один и тот же запрос столько раз за HTTP-запрос - подозрение на N+1
+    QUERY_REPEAT_THRESHOLD: int = 5
+
     @property
     def DB_URL(self) -> str:
         return f"{self.DB_ENGINE}:///{BASE_DIR}/{self.DB_NAME}.db"
 
+    @property
+    def ASYNC_DB_URL(self) -> str:
+        driver = ASYNC_DRIVERS.get(self.DB_ENGINE, self.DB_ENGINE)
+        return f"{driver}:///{BASE_DIR}/{self.DB_NAME}.db"
+
+    @property
+    def DB_PRAGMAS(self) -> dict:
+        if self.DB_PROFILE == "default":
+            return {}
+        return {
+            # Действует для новой базы (до создания таблиц); нужно для PRAGMA incremental_vacuum
+            "auto_vacuum": "INCREMENTAL",
+            "journal_mode": self.DB_JOURNAL_MODE,
+            "synchronous": self.DB_SYNCHRONOUS,
+            "busy_timeout": self.DB_BUSY_TIMEOUT_MS,
+            "mmap_size": self.DB_MMAP_SIZE,
+            "cache_size": self.DB_CACHE_SIZE,
+            "temp_store": self.DB_TEMP_STORE,
+        }
+
 
     model_config =  SettingsConfigDict(env_file=BASE_DIR / ".env")
 
@@ -1,16 +1,63 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import Connection, create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from src.config import settings
 
-engine = create_engine(settings.DB_URL)
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+}
+
+engine = create_engine(settings.DB_URL, **POOL_OPTIONS)
 Session_maker = sessionmaker(engine, expire_on_commit=False)
 
+# Асинхронный доступ для роутов; синхронный остается для populate_db и скриптов
+async_engine = create_async_engine(settings.ASYNC_DB_URL, **POOL_OPTIONS)
+Async_session_maker = async_sessionmaker(async_engine, expire_on_commit=False)
+
+def apply_pragmas(dbapi_connection, connection_record):
+    """Применяет PRAGMA профиля к каждому новому соединению SQLite"""
+    cursor = dbapi_connection.cursor()
+    for name, value in settings.DB_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", apply_pragmas)
+    event.listen(async_engine.sync_engine, "connect", apply_pragmas)
+
 class Base(DeclarativeBase):
     ...
 
-def create_tables():
-    Base.metadata.create_all(engine)
+def create_tables(conn: Connection | None = None):
+    if conn is None:
+        with engine.begin() as conn:
+            return create_tables(conn)
+    Base.metadata.create_all(conn)
+    create_missing_indexes(conn)
+
+def create_missing_indexes(conn: Connection):
+    """Досоздает индексы, добавленные в модели после создания таблиц (create_all их пропускает)"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 def delete_tables():
     Base.metadata.drop_all(engine)
+
+def begin_write(session: Session) -> None:
+    """Сразу берет блокировку на запись, чтобы прочитанное в транзакции не устарело до записи"""
+    if session.get_bind().dialect.name == "sqlite":
+        # SQLite по умолчанию откладывает блокировку до первого INSERT/UPDATE
+        session.execute(text("BEGIN IMMEDIATE"))
+
+async def begin_write_async(session: AsyncSession) -> None:
+    await session.run_sync(begin_write)
+
+def begin_read(session: Session) -> None:
+    """Открывает читающую транзакцию: все запросы видят один снимок базы, писатели не блокируются (WAL)"""
+    if session.get_bind().dialect.name == "sqlite":
+        # Без явного BEGIN драйвер не открывает транзакцию для SELECT и каждый запрос видит свое состояние
+        session.execute(text("BEGIN"))
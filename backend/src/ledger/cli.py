@@ -0,0 +1,32 @@
+import argparse
+import json
+import sys
+
+from src.migrations import migrate
+from src.ledger.service import LedgerService
+
+from src.user.models import *
+from src.clients.models import *
+from src.resources.models import *
+from src.ledger.models import *
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Журнал балансов: сверка, снимок и перестроение проекций")
+    parser.add_argument("command", choices=("verify", "snapshot", "rebuild"))
+    parser.add_argument("--full", action="store_true", help="Проигрывать журнал с начала, без снимка")
+    args = parser.parse_args()
+
+    migrate()
+    if args.command == "verify":
+        report = LedgerService.verify(args.full)
+    elif args.command == "snapshot":
+        report = LedgerService.snapshot()
+    else:
+        report = LedgerService.rebuild(args.full)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.command == "verify" and not report["ok"]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,37 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, func
+from datetime import datetime
+from src.db import Base
+
+class LedgerEntryOrm(Base):
+    """
+    Запись журнала: одно изменение балансов и сдвиги затронутых счетов.
+    Строки только добавляются; балансы в client_balances, resources и bank_account - проекции журнала
+    """
+    __tablename__ = "ledger"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str]  # deposit, withdraw, register, balance_edit, bank_open, bank_edit, resource_*, opening
+    player: Mapped[str] = mapped_column(nullable=True)
+    resource: Mapped[str] = mapped_column(nullable=True)
+    client_delta: Mapped[float] = mapped_column(default=0)
+    bank_delta: Mapped[float] = mapped_column(default=0)
+    resource_delta: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+class LedgerSnapshotOrm(Base):
+    """Снимок балансов по журналу до записи last_entry_id включительно"""
+    __tablename__ = "ledger_snapshots"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    last_entry_id: Mapped[int]
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+class LedgerSnapshotBalanceOrm(Base):
+    __tablename__ = "ledger_snapshot_balances"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    snapshot_id: Mapped[int] = mapped_column(index=True)
+    account: Mapped[str]  # client, resource или bank
+    name: Mapped[str]  # Для банка - пустая строка
+    value: Mapped[float]
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from collections.abc import Iterator
+
+from sqlalchemy import Connection, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from src.clients.models import ClientBalanceOrm, BankAccountOrm
+from src.ledger.models import LedgerEntryOrm, LedgerSnapshotOrm, LedgerSnapshotBalanceOrm
+from src.resources.models import ResourceOrm
+
+# Строк журнала и проекций за одну выборку при потоковом проходе
+STREAM_CHUNK = 10000
+
+# last_entry_id снимка, строки которого еще дописываются: такие снимки replay не видит
+PENDING_SNAPSHOT = -1
+
+# Счет проекции: (вид, имя); у банка один счет с пустым именем
+Account = tuple[str, str]
+BANK = ("bank", "")
+
+
+class LedgerRepository:
+    @staticmethod
+    def append(session: Session, kind: str, player=None, resource=None,
+               client_delta=0, bank_delta=0, resource_delta=0) -> None:
+        """
+        Добавляет запись в транзакции вызывающего, до изменения балансов:
+        имена и сдвиги могут быть SQL-выражениями от еще не измененных строк
+        """
+        session.execute(insert(LedgerEntryOrm).values(
+            kind=kind, player=player, resource=resource,
+            client_delta=client_delta, bank_delta=bank_delta, resource_delta=resource_delta,
+        ))
+
+    @staticmethod
+    def append_many(session: Session, entries: list[dict]) -> None:
+        if entries:
+            session.execute(insert(LedgerEntryOrm), entries)
+
+    @staticmethod
+    def open_accounts(conn: Connection) -> None:
+        """Записи opening с текущими балансами для данных, записанных мимо журнала"""
+        columns = ["kind", "player", "resource", "client_delta", "bank_delta", "resource_delta"]
+        conn.execute(insert(LedgerEntryOrm).from_select(columns, select(
+            literal("opening"), ClientBalanceOrm.name, literal(None), ClientBalanceOrm.balance, literal(0), literal(0)
+        )))
+        conn.execute(insert(LedgerEntryOrm).from_select(columns, select(
+            literal("opening"), literal(None), ResourceOrm.name, literal(0), literal(0), ResourceOrm.amount
+        )))
+        conn.execute(insert(LedgerEntryOrm).from_select(columns, select(
+            literal("opening"), literal(None), literal(None), literal(0), BankAccountOrm.balance, literal(0)
+        )))
+
+    @staticmethod
+    def is_empty(conn: Connection) -> bool:
+        return conn.scalar(select(LedgerEntryOrm.id).limit(1)) is None
+
+    @staticmethod
+    def last_entry_id(session: Session) -> int:
+        return session.scalar(select(func.max(LedgerEntryOrm.id))) or 0
+
+    @staticmethod
+    def tail_length(session: Session) -> int:
+        """Записей после последнего снимка; id в журнале только растут, поэтому без подсчета строк"""
+        last_entry = LedgerRepository.last_entry_id(session)
+        snapshot_entry = session.scalar(select(func.max(LedgerSnapshotOrm.last_entry_id))) or 0
+        return last_entry - snapshot_entry
+
+    @staticmethod
+    def replay(session: Session, full: bool = False,
+               upto: int | None = None) -> tuple[dict[Account, float], int, int, int | None]:
+        """
+        Балансы по журналу: последний снимок плюс хвост записей после него (до upto включительно)
+        за один потоковый проход. Возвращает (балансы, id последней записи, сколько записей проиграно, id снимка)
+        """
+        snapshot = None if full else session.scalar(
+            select(LedgerSnapshotOrm).where(LedgerSnapshotOrm.last_entry_id > PENDING_SNAPSHOT)
+            .order_by(LedgerSnapshotOrm.id.desc()).limit(1)
+        )
+        balances: dict[Account, float] = defaultdict(int)
+        last_entry_id = 0
+        if snapshot is not None:
+            last_entry_id = snapshot.last_entry_id
+            rows = session.execute(
+                select(LedgerSnapshotBalanceOrm.account, LedgerSnapshotBalanceOrm.name, LedgerSnapshotBalanceOrm.value)
+                .where(LedgerSnapshotBalanceOrm.snapshot_id == snapshot.id)
+            )
+            for account, name, value in rows:
+                balances[(account, name)] = int(value) if account == "resource" else value
+        query = (
+            select(LedgerEntryOrm.id, LedgerEntryOrm.player, LedgerEntryOrm.resource,
+                   LedgerEntryOrm.client_delta, LedgerEntryOrm.bank_delta, LedgerEntryOrm.resource_delta)
+            .where(LedgerEntryOrm.id > last_entry_id, *([LedgerEntryOrm.id <= upto] if upto is not None else []))
+            .order_by(LedgerEntryOrm.id)
+            .execution_options(yield_per=STREAM_CHUNK)
+        )
+        replayed = 0
+        for entry_id, player, resource, client_delta, bank_delta, resource_delta in session.execute(query):
+            # Сдвиги прибавляются в порядке записи, как их применяли к проекциям
+            if player is not None and client_delta:
+                balances[("client", player)] += client_delta
+            if resource is not None and resource_delta:
+                balances[("resource", resource)] += resource_delta
+            if bank_delta:
+                balances[BANK] += bank_delta
+            last_entry_id = entry_id
+            replayed += 1
+        return balances, last_entry_id, replayed, snapshot.id if snapshot is not None else None
+
+    @staticmethod
+    def projections(session: Session) -> Iterator[tuple[str, int, str, float]]:
+        """Текущие проекции потоком: (вид счета, id строки, имя, значение)"""
+        sources = (
+            ("client", select(ClientBalanceOrm.id, ClientBalanceOrm.name, ClientBalanceOrm.balance)),
+            ("resource", select(ResourceOrm.id, ResourceOrm.name, ResourceOrm.amount)),
+            ("bank", select(BankAccountOrm.id, literal(""), BankAccountOrm.balance)),
+        )
+        for account, query in sources:
+            for row_id, name, value in session.execute(query.execution_options(yield_per=STREAM_CHUNK)):
+                yield account, row_id, name, value
+
+    @staticmethod
+    def update_projections(session: Session, updates: dict[str, list[dict]]) -> None:
+        """Записывает значения из журнала по первичному ключу: {вид счета: [{"id", значение}]}"""
+        tables = {"client": ClientBalanceOrm, "resource": ResourceOrm, "bank": BankAccountOrm}
+        for account, rows in updates.items():
+            if rows:
+                session.execute(update(tables[account]), rows)
+
+    @staticmethod
+    def begin_snapshot(session: Session) -> int:
+        """Заголовок нового снимка; пока он не закончен, replay его пропускает"""
+        snapshot = LedgerSnapshotOrm(last_entry_id=PENDING_SNAPSHOT)
+        session.add(snapshot)
+        session.flush()
+        return snapshot.id
+
+    @staticmethod
+    def add_snapshot_balances(session: Session, snapshot_id: int, balances: list[tuple[Account, float]]) -> None:
+        if balances:
+            # Через таблицу, а не ORM-модель: на миллионе счетов ORM-вставка в разы медленнее
+            session.execute(insert(LedgerSnapshotBalanceOrm.__table__), [
+                {"snapshot_id": snapshot_id, "account": account, "name": name, "value": value}
+                for (account, name), value in balances
+            ])
+
+    @staticmethod
+    def finish_snapshot(session: Session, snapshot_id: int, last_entry_id: int, keep: int) -> None:
+        """
+        Делает снимок видимым и снимает заголовки всех, кроме keep последних, и брошенных незаконченных.
+        Их строки остаются сиротами и удаляются delete_orphan_balances короткими транзакциями
+        """
+        session.execute(
+            update(LedgerSnapshotOrm).where(LedgerSnapshotOrm.id == snapshot_id).values(last_entry_id=last_entry_id)
+        )
+        stale = select(LedgerSnapshotOrm.id).where(LedgerSnapshotOrm.last_entry_id > PENDING_SNAPSHOT) \
+            .order_by(LedgerSnapshotOrm.id.desc()).offset(keep)
+        session.execute(delete(LedgerSnapshotOrm).where(
+            LedgerSnapshotOrm.id.in_(stale.scalar_subquery())
+            | ((LedgerSnapshotOrm.last_entry_id == PENDING_SNAPSHOT) & (LedgerSnapshotOrm.id < snapshot_id))
+        ))
+
+    @staticmethod
+    def delete_orphan_balances(session: Session, batch_size: int) -> int:
+        orphans = select(LedgerSnapshotBalanceOrm.id) \
+            .where(LedgerSnapshotBalanceOrm.snapshot_id.not_in(select(LedgerSnapshotOrm.id))).limit(batch_size)
+        return session.execute(delete(LedgerSnapshotBalanceOrm).where(LedgerSnapshotBalanceOrm.id.in_(orphans))).rowcount
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import math
+import time
+
+from sqlalchemy.orm import Session
+
+from src.clients.repository import MoneySupplyRepository
+from src.config import settings
+from src.db import Session_maker, Async_session_maker, begin_read, begin_write
+from src.ledger.repository import LedgerRepository, STREAM_CHUNK
+from src.resources.repository import MarketStateRepository
+
+logger = logging.getLogger(__name__)
+
+# Сдвиги правок балансов хранятся как new - old, поэтому сумма по журналу может отличаться
+# от записанного значения на ошибку округления
+REL_TOLERANCE = 1e-9
+ABS_TOLERANCE = 1e-6
+# Сколько расхождений показывать в отчете
+MISMATCH_EXAMPLES = 20
+# Пауза между короткими транзакциями снимка: SQLite не ставит ждущих писателей в очередь,
+# и без паузы сделки, ждущие блокировку в busy_timeout, могут не успеть ее взять
+SNAPSHOT_PAUSE = 0.02
+# Значение в проекции для каждого вида счета
+COLUMNS = {"client": "balance", "resource": "amount", "bank": "balance"}
+
+
+def _matches(projection: float, ledger: float) -> bool:
+    return math.isclose(projection, ledger, rel_tol=REL_TOLERANCE, abs_tol=ABS_TOLERANCE)
+
+
+class LedgerService:
+    """Журнал балансов: проекции перестраиваются и сверяются по последнему снимку и хвосту журнала"""
+
+    @classmethod
+    def verify(cls, full: bool = False) -> dict:
+        with Session_maker() as session:
+            # Журнал и проекции читаются из одного состояния базы, сделки при этом не ждут
+            begin_read(session)
+            report = cls.check(session, full)
+            session.rollback()
+            return report
+
+    @classmethod
+    def rebuild(cls, full: bool = False) -> dict:
+        with Session_maker() as session:
+            begin_write(session)
+            report = cls.apply_rebuild(session, full)
+            session.commit()
+            return report
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+        Снимок без долгой блокировки на запись: журнал проигрывается в читающей транзакции до
+        зафиксированного id (записи только добавляются), строки снимка пишутся короткими транзакциями,
+        а видимым снимок становится одним UPDATE заголовка
+        """
+        started = time.perf_counter()
+        with Session_maker() as session:
+            begin_read(session)
+            upto = LedgerRepository.last_entry_id(session)
+            balances, last_entry_id, replayed, _ = LedgerRepository.replay(session, upto=upto)
+            session.rollback()
+        with Session_maker() as session:
+            snapshot_id = LedgerRepository.begin_snapshot(session)
+            session.commit()
+        items = list(balances.items())
+        for start in range(0, len(items), STREAM_CHUNK):
+            with Session_maker() as session:
+                LedgerRepository.add_snapshot_balances(session, snapshot_id, items[start:start + STREAM_CHUNK])
+                session.commit()
+            time.sleep(SNAPSHOT_PAUSE)
+        with Session_maker() as session:
+            begin_write(session)
+            LedgerRepository.finish_snapshot(session, snapshot_id, last_entry_id, settings.LEDGER_SNAPSHOT_KEEP)
+            session.commit()
+        deleted = STREAM_CHUNK
+        while deleted == STREAM_CHUNK:
+            with Session_maker() as session:
+                deleted = LedgerRepository.delete_orphan_balances(session, STREAM_CHUNK)
+                session.commit()
+            time.sleep(SNAPSHOT_PAUSE)
+        return {
+            "snapshot_id": snapshot_id,
+            "last_entry_id": last_entry_id,
+            "entries_replayed": replayed,
+            "accounts": len(items),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    @staticmethod
+    def check(session: Session, full: bool = False) -> dict:
+        """Сверка проекций с журналом: один потоковый проход по хвосту журнала и один по проекциям"""
+        started = time.perf_counter()
+        balances, last_entry_id, replayed, snapshot_id = LedgerRepository.replay(session, full)
+        checked, mismatches, examples = 0, 0, []
+        for account, _, name, value in LedgerRepository.projections(session):
+            checked += 1
+            expected = balances.pop((account, name), 0)
+            if not _matches(value, expected):
+                mismatches += 1
+                if len(examples) < MISMATCH_EXAMPLES:
+                    examples.append({"account": account, "name": name, "projection": value, "ledger": expected})
+        # Счета с ненулевым балансом по журналу, которых нет в проекциях
+        for (account, name), expected in balances.items():
+            if not _matches(0, expected):
+                mismatches += 1
+                if len(examples) < MISMATCH_EXAMPLES:
+                    examples.append({"account": account, "name": name, "projection": None, "ledger": expected})
+        return {
+            "ok": mismatches == 0,
+            "snapshot_id": snapshot_id,
+            "last_entry_id": last_entry_id,
+            "entries_replayed": replayed,
+            "accounts_checked": checked,
+            "mismatches": mismatches,
+            "examples": examples,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    @staticmethod
+    def apply_rebuild(session: Session, full: bool = False) -> dict:
+        """Записывает в проекции расходящиеся с журналом балансы; строки, которых нет в проекциях, не создаются"""
+        started = time.perf_counter()
+        balances, last_entry_id, replayed, snapshot_id = LedgerRepository.replay(session, full)
+        updates = {account: [] for account in COLUMNS}
+        for account, row_id, name, value in LedgerRepository.projections(session):
+            expected = balances.pop((account, name), 0)
+            # Значения в пределах ошибки округления не трогаем: правки балансов остаются как их ввели
+            if not _matches(value, expected):
+                updates[account].append({"id": row_id, COLUMNS[account]: expected})
+        LedgerRepository.update_projections(session, updates)
+        # Денежная масса и цены зависят от балансов
+        MoneySupplyRepository.rebuild(session)
+        MarketStateRepository.bump(session)
+        return {
+            "snapshot_id": snapshot_id,
+            "last_entry_id": last_entry_id,
+            "entries_replayed": replayed,
+            "updated": {account: len(rows) for account, rows in updates.items()},
+            "missing": [{"account": account, "name": name} for (account, name), value in balances.items()
+                        if not _matches(0, value)][:MISMATCH_EXAMPLES],
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+class AsyncLedgerService:
+    # Проход по журналу занимает секунды на сотнях тысяч счетов: выполняется в потоке,
+    # чтобы не останавливать цикл событий
+
+    @classmethod
+    async def verify(cls, full: bool = False) -> dict:
+        return await asyncio.to_thread(LedgerService.verify, full)
+
+    @classmethod
+    async def snapshot(cls) -> dict:
+        return await asyncio.to_thread(LedgerService.snapshot)
+
+    @classmethod
+    async def snapshot_if_due(cls) -> dict | None:
+        """Снимок для фонового прохода: только если хвост журнала длиннее LEDGER_SNAPSHOT_MIN_ENTRIES"""
+        async with Async_session_maker() as session:
+            tail = await session.run_sync(LedgerRepository.tail_length)
+        if tail < settings.LEDGER_SNAPSHOT_MIN_ENTRIES:
+            return None
+        return await cls.snapshot()
+
+
+async def ledger_snapshot_loop() -> None:
+    """Фоновая задача приложения: снимок журнала раз в LEDGER_SNAPSHOT_INTERVAL_SECONDS, если хвост набрался"""
+    while True:
+        try:
+            await AsyncLedgerService.snapshot_if_due()
+        except Exception:
+            logger.exception("Ledger snapshot failed")
+        await asyncio.sleep(settings.LEDGER_SNAPSHOT_INTERVAL_SECONDS)
@@ -1,4 +1,6 @@
-from contextlib import asynccontextmanager
+import asyncio
+import time
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,19 +8,47 @@ import uvicorn
 
 from src.api import main_router
 
-from src.db import create_tables, delete_tables
+from src.config import settings
+from src.db import engine, async_engine
+from src.metrics.middleware import MetricsMiddleware
+from src.metrics.queries import instrument_engine
+from src.metrics.registry import metrics
+from src.migrations import LATEST_VERSION, migrate
 from src.populate_db import main as populate_db
+from src.resources.retention import compaction_loop
+from src.resources.feed import price_feed
+from src.resources.snapshots import snapshot_writer
+from src.ledger.service import ledger_snapshot_loop
 
 from src.user.models import *
 from src.clients.models import *
 from src.resources.models import *
+from src.ledger.models import *
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_tables()
+    started = time.perf_counter()
+    # Только недостающие миграции; данные между перезапусками сохраняются
+    applied = migrate()
     populate_db()
+    startup_time = time.perf_counter() - started
+    metrics.startup_time.set(startup_time)
+    metrics.schema_version.set(LATEST_VERSION)
+    print(f"Старт за {startup_time * 1000:.1f} мс, схема v{LATEST_VERSION}, применены миграции: {applied or 'нет'}")
+    background = []
+    if settings.COMPACTION_ENABLED:
+        background.append(asyncio.create_task(compaction_loop()))
+    if settings.LEDGER_SNAPSHOT_ENABLED:
+        background.append(asyncio.create_task(ledger_snapshot_loop()))
+    snapshot_writer.start()
     yield
-    delete_tables()
+    await snapshot_writer.stop()
+    await price_feed.stop()
+    for task in background:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(main_router)
@@ -36,6 +66,13 @@ app.add_middleware(
 )
 
 
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    # Добавляется последним, чтобы оборачивать все остальные middleware
+    app.add_middleware(MetricsMiddleware)
+
+
 def get_all_prices_res():
     ...
 
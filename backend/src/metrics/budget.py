@@ -0,0 +1,107 @@
+import logging
+
+from src.config import settings
+from src.metrics.queries import RequestStats, active_budgets, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# Бюджет маршрута: (запросов к БД, сессий) на один HTTP-запрос по текущей реализации, с учетом
+# холодного пути: перечитывание курсов (+1 запрос) и промах кэша токенов у админских маршрутов (+1 и +1).
+# Изменяющие рынок маршруты учитывают запись снимка истории цен в самом запросе (без окна объединения).
+# Поток цен и выгрузка истории - до первого кадра / одним серверным курсором при любом объеме.
+# Рост числа обращений к БД должен сопровождаться осознанной правкой этой таблицы
+ROUTE_QUERY_BUDGETS: dict[tuple[str, str], tuple[int, int]] = {
+    ("GET", "/api/resources/prices"): (6, 2),
+    ("GET", "/api/resources/stream"): (5, 1),
+    ("GET", "/api/resources/history/export"): (1, 1),
+    ("GET", "/api/resources/{resource}/history"): (2, 2),
+    ("GET", "/api/resources/{resource}/candles"): (1, 1),
+    ("POST", "/api/resources/public/deposit/earned"): (4, 2),
+    ("POST", "/api/resources/public/deposit/amount-for-money"): (4, 2),
+    ("POST", "/api/resources/public/withdraw/cost"): (4, 2),
+    ("POST", "/api/resources/public/withdraw/amount-for-money"): (4, 2),
+    ("POST", "/api/resources/public/quotes"): (5, 1),
+    ("GET", "/api/clients/balances"): (1, 1),
+    ("POST", "/api/clients/register"): (14, 5),
+    ("POST", "/api/auth/login"): (2, 2),
+    ("POST", "/api/admin/deposit"): (20, 4),
+    ("POST", "/api/admin/withdraw"): (20, 4),
+    ("POST", "/api/admin/trades/batch"): (20, 4),
+    ("POST", "/api/admin/update-balance"): (14, 5),
+    ("POST", "/api/admin/update-bank-balance"): (16, 5),
+    ("POST", "/api/admin/update-resource-amount"): (13, 5),
+    ("POST", "/api/admin/update-base-rate"): (12, 5),
+    ("POST", "/api/admin/add-resource"): (14, 6),
+    ("DELETE", "/api/admin/delete-resource"): (13, 5),
+    ("GET", "/api/admin/bank-balance"): (2, 2),
+    ("GET", "/api/admin/ledger/verify"): (7, 2),
+    ("POST", "/api/admin/ledger/snapshot"): (11, 6),
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def describe(stats: RequestStats) -> str:
+    """Места вызова и повторяющиеся запросы (N+1) по убыванию частоты"""
+    lines = [f"{stats.queries} queries, {stats.sessions} sessions"]
+    if stats.sites is not None:
+        lines.extend(f"  {count:>4} x {site}" for site, count in stats.sites.most_common())
+        repeated = [(sql, count) for sql, count in stats.statements.most_common()
+                    if count >= settings.QUERY_REPEAT_THRESHOLD]
+        for sql, count in repeated:
+            lines.append(f"  possible N+1: {count} x {' '.join(sql.split())[:200]}")
+    return "\n".join(lines)
+
+
+def check_route_budget(labels: tuple[str, str], stats: RequestStats) -> None:
+    """Пишет в лог места вызова, если запрос превысил бюджет маршрута или повторял один запрос"""
+    budget = ROUTE_QUERY_BUDGETS.get(labels)
+    over_budget = budget is not None and (stats.queries > budget[0] or stats.sessions > budget[1])
+    repeated = stats.statements is not None and any(
+        count >= settings.QUERY_REPEAT_THRESHOLD for count in stats.statements.values()
+    )
+    if over_budget or repeated:
+        logger.warning("%s %s over query budget %s: %s", *labels, budget, describe(stats))
+
+
+class QueryBudget:
+    """
+    Ограничение числа запросов к БД и сессий на блок кода, для тестов и скриптов
+    (считаются все запросы процесса, пока блок открыт):
+
+        async with QueryBudget(queries=6, sessions=3):
+            await client.post("/api/admin/deposit", ...)
+
+    При превышении бросает QueryBudgetExceeded с местами вызова.
+    """
+
+    def __init__(self, queries: int | None = None, sessions: int | None = None):
+        self.queries = queries
+        self.sessions = sessions
+        self.stats = RequestStats(trace=True)
+
+    def __enter__(self) -> "QueryBudget":
+        # Подключаем счетчики и при выключенных метриках
+        from src.db import engine, async_engine
+        instrument_engine(engine)
+        instrument_engine(async_engine.sync_engine)
+        active_budgets.append(self.stats)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        active_budgets.remove(self.stats)
+        if exc_type is not None:
+            return
+        if (self.queries is not None and self.stats.queries > self.queries) or \
+                (self.sessions is not None and self.stats.sessions > self.sessions):
+            raise QueryBudgetExceeded(
+                f"budget {self.queries} queries / {self.sessions} sessions exceeded: {describe(self.stats)}"
+            )
+
+    async def __aenter__(self) -> "QueryBudget":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
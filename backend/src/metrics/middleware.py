@@ -0,0 +1,49 @@
+import time
+
+from src.config import settings
+from src.metrics.budget import check_route_budget
+from src.metrics.queries import RequestStats, request_stats
+from src.metrics.registry import metrics
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: гистограмма задержек и коды ответов по шаблону маршрута, запросы в обработке,
+    время БД на запрос и заголовок Server-Timing.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(trace=settings.QUERY_BUDGET_TRACE)
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        status = 500
+        metrics.in_flight.inc()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                server_timing = (f'app;dur={(time.perf_counter() - started) * 1000:.2f}, '
+                                 f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"')
+                message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight.dec()
+            request_stats.reset(token)
+            # Шаблон маршрута вместо пути, чтобы не плодить метки; FastAPI кладет маршрут в scope при разборе
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched")
+            metrics.requests.inc((*labels, status))
+            metrics.latency.observe(time.perf_counter() - started, labels)
+            metrics.request_db_time.observe(stats.db_time, labels)
+            metrics.request_db_queries.inc(labels, stats.queries)
+            check_route_budget(labels, stats)
@@ -0,0 +1,94 @@
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.metrics.registry import metrics
+
+
+class RequestStats:
+    """Запросы к БД в рамках одного HTTP-запроса (или блока QueryBudget)"""
+    __slots__ = ("queries", "db_time", "sessions", "sites", "statements")
+
+    def __init__(self, trace: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.sessions = 0
+        # Только при трассировке: места вызова в коде src и тексты запросов с числом повторов
+        self.sites: Counter[str] | None = Counter() if trace else None
+        self.statements: Counter[str] | None = Counter() if trace else None
+
+
+# Счетчики запросов к БД текущего HTTP-запроса; вне запроса - None
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+# Открытые блоки QueryBudget: считают все запросы процесса, включая выполненные в других потоках (TestClient)
+active_budgets: list[RequestStats] = []
+
+
+def _record(stats: RequestStats, statement: str, elapsed: float, site: str | None) -> None:
+    stats.queries += 1
+    stats.db_time += elapsed
+    if stats.sites is not None:
+        stats.sites[site] += 1
+        stats.statements[statement] += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def call_site() -> str:
+    """
+    Ближайший кадр кода приложения (src, кроме src/metrics и src/db.py). Из гринлета SQLAlchemy
+    обход продолжается в родительском гринлете, где ждет корутина репозитория.
+    """
+    frame = sys._getframe(1)
+    current = greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if "/src/" in filename and "/src/metrics/" not in filename and not filename.endswith("/src/db.py"):
+                return f"{filename[filename.rindex('/src/') + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}"
+            frame = frame.f_back
+        current = current.parent
+        if current is None:
+            return "unknown"
+        frame = current.gr_frame
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    metrics.db_queries.inc()
+    metrics.db_time.inc((), elapsed)
+    stats = request_stats.get()
+    site = None
+    if (stats is not None and stats.sites is not None) or active_budgets:
+        site = call_site()
+    if stats is not None:
+        _record(stats, statement, elapsed, site)
+    for budget_stats in active_budgets:
+        _record(budget_stats, statement, elapsed, site)
+
+
+def _after_begin(session, transaction, connection):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.sessions += 1
+    for budget_stats in active_budgets:
+        budget_stats.sessions += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Считает число и время запросов движка (для асинхронного передается async_engine.sync_engine)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    # Каждая сессия открывает на соединении свою транзакцию: считаем их как сессии запроса
+    if not event.contains(Session, "after_begin", _after_begin):
+        event.listen(Session, "after_begin", _after_begin)
@@ -0,0 +1,127 @@
+from bisect import bisect_left
+from threading import Lock
+
+# Границы корзин гистограмм задержек, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: tuple = (), value: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, labels: tuple = ()) -> None:
+        with self._lock:
+            self.values[labels] = value
+
+    def dec(self, labels: tuple = (), value: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) - value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """Гистограмма Prometheus: наблюдение - поиск корзины делением пополам и два сложения"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._bounds = [f'le="{bound}"' for bound in (*buckets, "+Inf")]
+        # labels -> [счетчики по корзинам (не накопительные) + корзина +Inf, сумма]
+        self.values: dict[tuple, list] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self.values.get(labels)
+            if item is None:
+                item = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][index] += 1
+            item[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self._bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса. Запись идет и из цикла событий, и из рабочих потоков (синхронный движок
+    вызывается через asyncio.to_thread), поэтому каждая метрика обновляется под своей блокировкой.
+    """
+
+    def __init__(self):
+        route = ("method", "route")
+        self.requests = Counter("http_requests_total", "HTTP-запросы по маршруту и коду ответа", (*route, "status"))
+        self.latency = Histogram("http_request_duration_seconds", "Время обработки запроса", route)
+        self.in_flight = Gauge("http_requests_in_flight", "Запросы в обработке")
+        self.request_db_time = Histogram("http_request_db_seconds", "Время запросов к БД за один HTTP-запрос", route)
+        self.request_db_queries = Counter("http_request_db_queries_total", "Запросы к БД из HTTP-запросов", route)
+        self.db_queries = Counter("db_queries_total", "Все запросы к БД")
+        self.db_time = Counter("db_query_seconds_total", "Суммарное время запросов к БД")
+        self.snapshot_queue_depth = Gauge("price_snapshot_queue_depth", "Изменения рынка, ждущие снимка истории")
+        self.snapshot_requests = Counter("price_snapshot_requests_total", "Запросы на снимок истории цен")
+        self.snapshots_written = Counter("price_snapshots_written_total", "Записанные снимки истории цен")
+        self.snapshot_write_time = Histogram("price_snapshot_write_seconds", "Время записи снимка истории цен")
+        self.startup_time = Gauge("app_startup_seconds", "Время старта приложения: миграции и проверка начальных данных")
+        self.schema_version = Gauge("db_schema_version", "Версия схемы БД после миграций")
+        for metric in (self.in_flight, self.db_queries, self.db_time, self.snapshot_queue_depth,
+                       self.snapshot_requests, self.snapshots_written):
+            metric.inc((), 0)
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.requests, self.latency, self.in_flight, self.request_db_time,
+                       self.request_db_queries, self.db_queries, self.db_time, self.snapshot_queue_depth,
+                       self.snapshot_requests, self.snapshots_written, self.snapshot_write_time,
+                       self.startup_time, self.schema_version):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,167 @@
+import logging
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Connection, DateTime, func, inspect, select, text, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db import Base, Session_maker, begin_write, engine
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaVersionOrm(Base):
+    """Журнал примененных миграций: строка на каждую версию схемы"""
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str]
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+
+# Схема до введения миграций. Зафиксирована текстом: модели меняются, а первая миграция
+# должна создавать ровно ту схему, на которую рассчитаны следующие
+BASELINE_DDL = (
+    """CREATE TABLE IF NOT EXISTS bank_account (
+        id INTEGER NOT NULL,
+        balance FLOAT NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS client_balances (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        balance FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS resources (
+        id INTEGER NOT NULL,
+        name VARCHAR NOT NULL,
+        amount INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )""",
+    """CREATE TABLE IF NOT EXISTS resource_price_history (
+        id INTEGER NOT NULL,
+        resource_name VARCHAR NOT NULL,
+        price FLOAT NOT NULL,
+        timestamp DATETIME NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER NOT NULL,
+        login VARCHAR NOT NULL,
+        password VARCHAR NOT NULL,
+        auth_token VARCHAR,
+        role VARCHAR(5) NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+)
+
+
+def _baseline(conn: Connection) -> None:
+    # Пустая база получает исходную схему; базы, созданные до миграций, не меняются
+    for statement in BASELINE_DDL:
+        conn.execute(text(statement))
+
+
+def _resources_base_rate(conn: Connection) -> None:
+    # Базы до переноса курсов в БД: добавляем колонку и заполняем курсами по умолчанию
+    columns = {column["name"] for column in inspect(conn).get_columns("resources")}
+    if "base_rate" in columns:
+        return
+    from src.resources.calc import ResourceCalculator
+    from src.resources.models import ResourceOrm
+    conn.execute(text("ALTER TABLE resources ADD COLUMN base_rate FLOAT NOT NULL DEFAULT 1"))
+    for name, rate in ResourceCalculator.DEFAULT_BASE_RATES.items():
+        conn.execute(update(ResourceOrm).where(ResourceOrm.name == name).values(base_rate=rate))
+
+
+def _ledger(conn: Connection) -> None:
+    # Журнал балансов: существующие балансы становятся записями opening, дальше проекции меняются через журнал
+    from src.ledger.models import LedgerEntryOrm, LedgerSnapshotOrm, LedgerSnapshotBalanceOrm
+    from src.ledger.repository import LedgerRepository
+    for model in (LedgerEntryOrm, LedgerSnapshotOrm, LedgerSnapshotBalanceOrm):
+        model.__table__.create(conn, checkfirst=True)
+    if LedgerRepository.is_empty(conn):
+        LedgerRepository.open_accounts(conn)
+
+
+def _backfill_candles(conn: Connection) -> None:
+    # История до появления свечей: сворачиваем ее в свечи до того, как хранение удалит старые точки
+    from src.resources.models import ResourcePriceCandleOrm, ResourcePriceHistoryOrm
+    from src.resources.repository import ResourceRepository
+    ResourcePriceCandleOrm.__table__.create(conn, checkfirst=True)
+    for index in ResourcePriceHistoryOrm.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    ResourceRepository.backfill_candles(conn)
+
+
+def _market_rows(conn: Connection) -> None:
+    # Единственные строки агрегата денежной массы и состояния рынка: пути чтения их больше не создают
+    from src.clients.models import MoneySupplyOrm
+    from src.clients.repository import MoneySupplyRepository
+    from src.resources.models import MarketStateOrm
+    from src.resources.repository import MarketStateRepository
+    for model in (MoneySupplyOrm, MarketStateOrm):
+        model.__table__.create(conn, checkfirst=True)
+    MoneySupplyRepository.ensure(conn)
+    MarketStateRepository.ensure(conn)
+
+
+def _candle_interval_index(conn: Connection) -> None:
+    from src.resources.models import ResourcePriceCandleOrm
+    for index in ResourcePriceCandleOrm.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _users_indexes(conn: Connection) -> None:
+    # Поиск пользователя по логину и токену при каждом запросе с авторизацией
+    from src.user.models import UserOrm
+    for index in UserOrm.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+# Миграции по возрастанию версии; каждая должна быть идемпотентной,
+# чтобы одинаково проходить на пустой базе и на базе, созданной до появления журнала
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", _baseline),
+    (2, "resources_base_rate", _resources_base_rate),
+    (3, "ledger", _ledger),
+    (4, "backfill_candles", _backfill_candles),
+    (5, "market_rows", _market_rows),
+    (6, "candle_interval_index", _candle_interval_index),
+    (7, "users_indexes", _users_indexes),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(SchemaVersionOrm.__tablename__):
+        return 0
+    return conn.scalar(select(func.coalesce(func.max(SchemaVersionOrm.version), 0)))
+
+
+def migrate() -> list[int]:
+    """Применяет недостающие миграции; возвращает номера примененных версий"""
+    # Быстрый путь без блокировки на запись: схема уже актуальна
+    with engine.connect() as conn:
+        if current_version(conn) >= LATEST_VERSION:
+            return []
+    applied = []
+    with Session_maker() as session:
+        # Воркеры стартуют одновременно: мигрирует первый, остальные ждут блокировку и видят новую версию
+        begin_write(session)
+        conn = session.connection()
+        SchemaVersionOrm.__table__.create(conn, checkfirst=True)
+        version = current_version(conn)
+        for number, name, apply in MIGRATIONS:
+            if number <= version:
+                continue
+            apply(conn)
+            session.add(SchemaVersionOrm(version=number, name=name))
+            session.flush()
+            applied.append(number)
+            logger.info("Applied migration %s %s", number, name)
+        session.commit()
+    return applied
@@ -1,4 +1,17 @@
 
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from src.db import Session_maker
+from src.clients.models import ClientBalanceOrm, BankAccountOrm
+from src.clients.repository import MoneySupplyRepository
+from src.ledger.repository import LedgerRepository
+from src.resources.models import ResourceOrm
+from src.resources.repository import CANDLE_INTERVALS, MarketStateRepository, candle_bucket
 from src.user.enum.user_status import UserStatus
 from src.user.schemas import UserRegisterSchema
 from src.user.service import UserService
@@ -7,6 +20,7 @@ from src.clients.service import ClientBalanceService, BankAccountService
 from src.resources.schemas import ResourcePriceSchema
 from src.resources.service import ResourceService, ResourceHistoryService
 from src.resources.calc import ResourceCalculator
+from src.migrations import migrate
 
 client_balances = {
     "sunny": 8,
@@ -23,9 +37,8 @@ bank_resources = {
 }
 
 def main():
-    # Проверяем, есть ли уже данные в базе
-    existing_clients = ClientBalanceService.all()
-    if existing_clients:
+    # Проверяем, есть ли уже данные в базе (без загрузки всех клиентов)
+    if ClientBalanceService.exists():
         print("База данных уже заполнена. Пропускаем заполнение.")
         return
     
@@ -42,9 +55,112 @@ def main():
     BankAccountService.update(initial_bank_balance)
     
     # Записываем начальную историю цен для всех ресурсов
-    clients = ClientBalanceService.all()
-    ResourceHistoryService.update_all_prices_history(clients)
+    ResourceHistoryService.update_all_prices_history()
     print("База данных успешно заполнена начальными данными.")
 
+# Размер пачки строк для одного executemany в режиме масштаба
+INSERT_CHUNK = 50000
+
+def populate_scale(clients: int, resources: int, snapshots: int, seed: int = 42,
+                   interval: timedelta = timedelta(minutes=1), volatility: float = 0.01) -> dict:
+    """
+    Синтетическая база для нагрузочных тестов: clients клиентов, resources ресурсов с курсами
+    и snapshots снимков цен (случайное блуждание) со свечами. Пишется пакетными INSERT в одной транзакции.
+    """
+    rng = random.Random(seed)
+    UserService.add(UserRegisterSchema(login="root", password="root", role=UserStatus.admin))
+    rates = dict(ResourceCalculator.DEFAULT_BASE_RATES)
+    for i in range(len(rates), resources):
+        rates[f"Ресурс {i}"] = rng.choice([0.5, 1, 2, 8, 64, 128])
+    names = list(rates)[:resources]
+    history_rows = 0
+    candle_rows = 0
+    with Session_maker() as session:
+        session.execute(insert(BankAccountOrm), [{"balance": 10_000_000.0}])
+        for start in range(0, clients, INSERT_CHUNK):
+            session.execute(insert(ClientBalanceOrm), [
+                {"name": f"player{i:06d}", "balance": round(rng.uniform(100, 100_000), 2)}
+                for i in range(start, min(clients, start + INSERT_CHUNK))
+            ])
+        session.execute(insert(ResourceOrm), [
+            {"name": name, "amount": rng.randint(1_000, 100_000), "base_rate": rates[name]} for name in names
+        ])
+        # Начальные балансы - записи opening журнала, одним INSERT ... SELECT на таблицу
+        LedgerRepository.open_accounts(session.connection())
+        MoneySupplyRepository.rebuild(session)
+        MarketStateRepository.bump(session, rates=True)
+
+        # Геометрическое случайное блуждание от цены около базовой, последний снимок - текущий момент
+        prices = {name: ResourceCalculator.BASE_DIAMOND_PRICE / rates[name] * rng.uniform(0.5, 2) for name in names}
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        # Строки идут в драйвер напрямую: ORM-вставка миллиона строк в разы медленнее.
+        # Даты в формате, в котором их хранит тип DateTime SQLAlchemy для SQLite
+        connection = session.connection()
+        history_sql = "INSERT INTO resource_price_history (resource_name, price, timestamp) VALUES (?, ?, ?)"
+        candle_sql = ("INSERT INTO resource_price_candles (resource_name, interval, bucket_start, open, high, low, close, count) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+        candles: dict[tuple[str, str], list] = {}
+        history, finished = [], []
+        for k in range(snapshots):
+            timestamp = now - interval * (snapshots - 1 - k)
+            stamp = timestamp.isoformat(" ", "microseconds")
+            buckets = {step: candle_bucket(timestamp, step).isoformat(" ", "microseconds") for step in CANDLE_INTERVALS}
+            for name in names:
+                price = prices[name] = prices[name] * (1 + rng.gauss(0, volatility))
+                history.append((name, price, stamp))
+                for step, bucket in buckets.items():
+                    # [resource_name, interval, bucket_start, open, high, low, close, count]
+                    candle = candles.get((name, step))
+                    if candle is None or candle[2] != bucket:
+                        if candle is not None:
+                            finished.append(candle)
+                        candles[(name, step)] = [name, step, bucket, price, price, price, price, 1]
+                    else:
+                        if price > candle[4]:
+                            candle[4] = price
+                        if price < candle[5]:
+                            candle[5] = price
+                        candle[6] = price
+                        candle[7] += 1
+            if len(history) >= INSERT_CHUNK:
+                connection.exec_driver_sql(history_sql, history)
+                history_rows += len(history)
+                history = []
+            if len(finished) >= INSERT_CHUNK:
+                connection.exec_driver_sql(candle_sql, [tuple(candle) for candle in finished])
+                candle_rows += len(finished)
+                finished = []
+        finished.extend(candles.values())
+        if history:
+            connection.exec_driver_sql(history_sql, history)
+            history_rows += len(history)
+        if finished:
+            connection.exec_driver_sql(candle_sql, [tuple(candle) for candle in finished])
+            candle_rows += len(finished)
+        session.commit()
+    return {"clients": clients, "resources": len(names), "history": history_rows, "candles": candle_rows}
+
+def cli():
+    parser = argparse.ArgumentParser(description="Заполнение базы: начальные данные или синтетика для нагрузки")
+    parser.add_argument("--clients", type=int, help="Режим масштаба: число клиентов")
+    parser.add_argument("--resources", type=int, default=50, help="Число ресурсов (не меньше 1)")
+    parser.add_argument("--snapshots", type=int, default=20000, help="Снимков цен; строк истории = snapshots * resources")
+    parser.add_argument("--interval", type=float, default=60, help="Секунд между снимками")
+    parser.add_argument("--volatility", type=float, default=0.01, help="Стандартное отклонение шага цены")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    migrate()
+    if args.clients is None:
+        main()
+        return
+    if ClientBalanceService.exists():
+        print("База данных уже заполнена. Пропускаем заполнение.")
+        return
+    started = time.perf_counter()
+    stats = populate_scale(args.clients, max(1, args.resources), args.snapshots, args.seed,
+                           timedelta(seconds=args.interval), args.volatility)
+    print(f"Синтетические данные записаны за {time.perf_counter() - started:.1f} с: {stats}")
+
 if __name__ == '__main__':
-    main()
+    cli()
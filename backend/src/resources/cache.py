@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from threading import Lock
+
+from src.config import settings
+from src.resources.repository import AsyncMarketStateRepository
+
+
+class MarketCache:
+    """
+    Кэш сериализованных ответов с ценами, действительный до следующего изменения рынка.
+    Версия рынка хранится в market_state и общая для всех воркеров; ответы держатся только для последней
+    увиденной версии.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple, tuple[int, bytes]] = OrderedDict()
+        self._lock = Lock()
+
+    async def current(self) -> tuple[int, str]:
+        """Текущая версия рынка и ее ETag (одно чтение строки по первичному ключу)"""
+        state = await AsyncMarketStateRepository.get()
+        return state.version, f'"{state.epoch}-{state.version}"'
+
+    async def bump(self) -> None:
+        await AsyncMarketStateRepository.bump()
+
+    def get(self, key: tuple, version: int) -> bytes | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] != version:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: tuple, version: int, body: bytes) -> None:
+        """version берется до чтения из БД, чтобы ответ, посчитанный во время записи, не пережил ее"""
+        with self._lock:
+            if version < self.version:
+                return
+            if version > self.version:
+                self.version = version
+                self._items.clear()
+            self._items[key] = (version, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version = 0
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+market_cache = MarketCache(max_size=settings.MARKET_CACHE_SIZE)
@@ -1,8 +1,39 @@
 import math
+from itertools import accumulate
+
+# Префиксные гармонические суммы H(n) = 1 + 1/2 + ... + 1/n для n <= HARMONIC_TABLE_SIZE
+HARMONIC_TABLE_SIZE = 1 << 16
+_HARMONIC = [0.0, *accumulate(1 / n for n in range(1, HARMONIC_TABLE_SIZE + 1))]
+# Снятия не больше этого числа единиц считаются прямым суммированием (точное совпадение с циклом)
+DIRECT_SUM_LIMIT = 32
+# Относительная погрешность O(1) стоимости снятия; ближе к сумме денег сравнение идет по точной сумме
+WITHDRAW_TIE_TOLERANCE = 1e-9
+
+
+def _harmonic_tail(n: int) -> float:
+    """Поправка H(n) - ln(n) - γ из асимптотического разложения (дигамма-функции)"""
+    inv = 1 / n
+    inv2 = inv * inv
+    return inv / 2 - inv2 * (1 / 12 - inv2 * (1 / 120 - inv2 / 252))
+
+
+def _harmonic(n: int) -> float:
+    if n <= HARMONIC_TABLE_SIZE:
+        return _HARMONIC[n]
+    return math.log(n) + 0.5772156649015329 + _harmonic_tail(n)
+
+
+def harmonic_diff(hi: int, lo: int) -> float:
+    """H(hi) - H(lo) = 1/(lo+1) + ... + 1/hi за O(1), 0 <= lo <= hi"""
+    if lo > HARMONIC_TABLE_SIZE:
+        # Оба аргумента вне таблицы: разность логарифмов через log1p, чтобы не терять точность
+        return math.log1p((hi - lo) / lo) + _harmonic_tail(hi) - _harmonic_tail(lo)
+    return _harmonic(hi) - _HARMONIC[lo]
 
 
 class ResourceCalculator:
-    BASE_RATES = {
+    # Курсы по умолчанию для начального заполнения БД (1 алмаз = N ресурса)
+    DEFAULT_BASE_RATES = {
         "Незеритовый слиток": 0.5,
         "Лазурит": 128,
         "Редстоун": 128,
@@ -10,18 +41,32 @@ class ResourceCalculator:
         "Жемчуг эндера": 2,
         "Алмаз": 1
     }
+    # Кэш курсов процесса: хранятся в resources.base_rate, перечитываются при смене market_state.rates_version
+    BASE_RATES: dict[str, float] = {}
+    rates_version: int | None = None
     BASE_DIAMOND_PRICE = 10
     MIN_TOTAL_DOLLARS = 1000
     MARKET_NORMALIZATION = 100
+    # Предел количества при подборе объёма под сумму денег
+    AMOUNT_SEARCH_LIMIT = 100000
+
+    @classmethod
+    def set_rates(cls, rates_version: int, rates: dict[str, float]) -> None:
+        # Заменяем словарь целиком, чтобы параллельные расчеты не видели его наполовину обновленным
+        cls.BASE_RATES = rates
+        cls.rates_version = rates_version
+
+    @classmethod
+    def get_total_dollars(cls) -> int:
+        # Используем сумму банковского счета и всех клиентских балансов (поддерживаемый агрегат);
+        # заодно сверяем версию курсов
+        from src.resources.service import MarketService
+        return int(MarketService.total())
 
     @classmethod
-    def get_total_dollars(cls, client_balances: list) -> int:
-        # Используем сумму банковского счета и всех клиентских балансов
-        from src.clients.service import BankAccountService
-        bank_account = BankAccountService.get()
-        client_total = sum(c.balance for c in client_balances)
-        total = bank_account.balance + client_total
-        return int(total)
+    async def get_total_dollars_async(cls) -> int:
+        from src.resources.service import AsyncMarketService
+        return int(await AsyncMarketService.total())
 
     @classmethod
     def get_resource_price(cls, resource_name: str, amount: int, total_dollars: float) -> float:
@@ -41,11 +86,93 @@ class ResourceCalculator:
     @classmethod
     def calc_withdraw_cost(cls, resource_name: str, current_amount: int, withdraw_amount: int,
                            total_dollars: float) -> float:
+        """
+        Стоимость снятия: сумма цен (normalized_dollars * base_value) / max(1, current_amount - i)
+        по i от 0 до withdraw_amount - 1.
+
+        Считается за O(1) через разность гармонических чисел; результат совпадает
+        с поэлементным суммированием с относительной погрешностью не хуже 1e-9.
+        """
+        if withdraw_amount <= 0:
+            return 0
         base_value = (1 / cls.BASE_RATES.get(resource_name, 1)) * cls.BASE_DIAMOND_PRICE
         normalized_dollars = total_dollars / cls.MARKET_NORMALIZATION
+        numerator = normalized_dollars * base_value
+        if withdraw_amount <= DIRECT_SUM_LIMIT:
+            return cls._direct_withdraw_cost(numerator, current_amount, withdraw_amount)
+        # Пока остаток >= 1, цена единицы равна numerator / остаток, дальше знаменатель упирается в 1
+        stock = max(current_amount, 0)
+        priced = min(withdraw_amount, stock)
+        return numerator * (harmonic_diff(stock, stock - priced) + (withdraw_amount - priced))
+
+    @staticmethod
+    def _direct_withdraw_cost(numerator: float, current_amount: int, withdraw_amount: int) -> float:
+        """Поэлементная сумма в исходном порядке: эталон, с которым совпадает O(1) формула"""
         cost = 0
         for i in range(withdraw_amount):
             # Используем ту же логику, что и в get_resource_price для согласованности
-            price = (normalized_dollars * base_value) / max(1, current_amount - i)
-            cost += price
+            cost += numerator / max(1, current_amount - i)
         return cost
+
+    @classmethod
+    def calc_deposit_amount_for_money(cls, resource_name: str, current_amount: int, target_money: float,
+                                      total_dollars: float) -> tuple[int, float]:
+        """Минимальное количество для депозита, за которое начислят не меньше target_money"""
+        if target_money <= 0:
+            return 0, 0
+        limit = cls.AMOUNT_SEARCH_LIMIT + 1
+        unit_earned = cls.calc_deposit_earned(resource_name, current_amount, 1, total_dollars)
+        ratio = target_money / unit_earned if unit_earned > 0 else math.inf
+        n = limit if ratio >= limit else max(1, math.ceil(ratio))
+        # Доводим аналитическую оценку до точного минимума с учётом округления
+        while n > 1 and cls.calc_deposit_earned(resource_name, current_amount, n - 1, total_dollars) >= target_money:
+            n -= 1
+        while n < limit and cls.calc_deposit_earned(resource_name, current_amount, n, total_dollars) < target_money:
+            n += 1
+        return n, cls.calc_deposit_earned(resource_name, current_amount, n, total_dollars)
+
+    @classmethod
+    def calc_withdraw_amount_for_money(cls, resource_name: str, current_amount: int, available_money: float,
+                                       total_dollars: float) -> tuple[int, float]:
+        """Максимальное количество для снятия, стоимость которого не превышает available_money"""
+        numerator = (total_dollars / cls.MARKET_NORMALIZATION) * \
+            ((1 / cls.BASE_RATES.get(resource_name, 1)) * cls.BASE_DIAMOND_PRICE)
+
+        def affordable(amount: int) -> bool:
+            cost = cls.calc_withdraw_cost(resource_name, current_amount, amount, total_dollars)
+            if abs(cost - available_money) > WITHDRAW_TIE_TOLERANCE * abs(available_money):
+                return cost <= available_money
+            # Сумма на границе погрешности формулы: решаем по поэлементной сумме, как исходный цикл.
+            # Соседние количества отличаются на цену единицы, поэтому так проверяется одно-два значения
+            return cls._direct_withdraw_cost(numerator, current_amount, amount) <= available_money
+
+        # Стоимость растёт с количеством, поэтому ищем границу бинарным поиском
+        lo, hi = 0, max(0, min(current_amount, cls.AMOUNT_SEARCH_LIMIT))
+        if available_money < 0:
+            hi = 0
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if affordable(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo, cls.calc_withdraw_cost(resource_name, current_amount, lo, total_dollars)
+
+    @classmethod
+    def quote_grid(cls, stock: dict[str, int], quantities: list[int],
+                   total_dollars: float) -> dict[str, dict[str, list[float]]]:
+        """
+        Сетка котировок по одному снимку рынка: для каждого ресурса начисление за депозит
+        и стоимость снятия каждого количества из quantities.
+        Значения совпадают с calc_deposit_earned / calc_withdraw_cost.
+        """
+        normalized_dollars = total_dollars / cls.MARKET_NORMALIZATION
+        grid = {}
+        for name, current_amount in stock.items():
+            # Цена единицы для депозита одна на весь ряд, снятие считается за O(1) на ячейку
+            unit_price = normalized_dollars * ((1 / cls.BASE_RATES.get(name, 1)) * cls.BASE_DIAMOND_PRICE) / max(1, current_amount)
+            grid[name] = {
+                "deposit": [unit_price * q * 0.95 for q in quantities],
+                "withdraw": [cls.calc_withdraw_cost(name, current_amount, q, total_dollars) for q in quantities],
+            }
+        return grid
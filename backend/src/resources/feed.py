@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Комментарий-пинг для прокси, если рынок долго не меняется (сек)
+KEEPALIVE_INTERVAL = 15
+
+
+class PriceFeed:
+    """
+    Рассылка кадров цен SSE-подписчикам: кадр сериализуется один раз на изменение рынка.
+    Подписчики живут в памяти процесса, а снимки пишет воркер, принявший изменение. Поэтому, пока
+    есть подписчики, каждый воркер раз в poll_seconds сверяет общую версию рынка (market_state)
+    и сам рассылает новые цены: изменения других воркеров доходят с задержкой до poll_seconds.
+    """
+
+    def __init__(self, queue_size: int = 4, poll_seconds: float = 0):
+        self.queue_size = queue_size
+        self.poll_seconds = poll_seconds
+        self.last_frame: bytes | None = None
+        self.published = 0
+        self.dropped = 0
+        self.version: int | None = None  # Версия рынка последнего опроса
+        self._last_resources: list[dict] | None = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._poller: asyncio.Task | None = None
+
+    def publish(self, resources: list[dict], timestamp: datetime) -> None:
+        if resources == self._last_resources:
+            # Тот же рынок уже разослан (опросом или снимком своего процесса)
+            return
+        self._last_resources = resources
+        payload = json.dumps({"timestamp": timestamp.isoformat(), "resources": resources}, ensure_ascii=False)
+        frame = f"event: prices\ndata: {payload}\n\n".encode()
+        self.last_frame = frame
+        self.published += 1
+        for queue in self._subscribers:
+            if queue.full():
+                # Медленный подписчик: выбрасываем самый старый кадр, актуальная цена важнее пропущенных
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(frame)
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        if self.poll_seconds > 0 and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            if self.last_frame is not None:
+                yield self.last_frame
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+    async def _poll(self) -> None:
+        """Опрос версии рынка, пока есть подписчики"""
+        from src.resources.repository import AsyncMarketStateRepository
+        from src.resources.service import AsyncResourceService
+        while self._subscribers:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                version = (await AsyncMarketStateRepository.get()).version
+                if version == self.version:
+                    continue
+                # Цены читаются после версии, поэтому отражают как минимум ее
+                prices = await AsyncResourceService.prices()
+                self.publish([res.model_dump() for res in prices], datetime.now(timezone.utc).replace(tzinfo=None))
+                self.version = version
+            except Exception:
+                logger.exception("Price feed poll failed")
+
+    async def stop(self) -> None:
+        """Останавливает опрос (вызывается из lifespan)"""
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    def clear(self) -> None:
+        """Забывает последний кадр: следующий publish разошлется, даже если цены не изменились"""
+        self.last_frame = None
+        self.version = None
+        self._last_resources = None
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "poll_seconds": self.poll_seconds,
+            "version": self.version,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+price_feed = PriceFeed(poll_seconds=settings.PRICE_FEED_POLL_SECONDS)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import DateTime, func
+from sqlalchemy import DateTime, Index, UniqueConstraint, func
 from datetime import datetime
 from src.db import Base
 
@@ -9,11 +9,47 @@ class ResourceOrm(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(unique=True)
     amount: Mapped[int]
+    base_rate: Mapped[float] = mapped_column(default=1)  # 1 алмаз = N ресурса
+
+class MarketStateOrm(Base):
+    """
+    Единственная строка с версиями рынка, общая для всех воркеров:
+    version растет при любом изменении цен, rates_version - при изменении курсов
+    """
+    __tablename__ = "market_state"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(default=0)
+    rates_version: Mapped[int] = mapped_column(default=0)
+    epoch: Mapped[str]  # Случайная метка базы для ETag: после пересоздания версии начинаются заново
 
 class ResourcePriceHistoryOrm(Base):
     __tablename__ = "resource_price_history"
+    __table_args__ = (
+        # История ресурса читается как resource_name = ? ORDER BY timestamp DESC LIMIT n
+        Index("ix_resource_price_history_resource_name_timestamp", "resource_name", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     resource_name: Mapped[str]
     price: Mapped[float]
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=func.now())
+
+class ResourcePriceCandleOrm(Base):
+    """Свеча OHLC по ресурсу, дополняется при каждой записи снимка цен"""
+    __tablename__ = "resource_price_candles"
+    __table_args__ = (
+        UniqueConstraint("resource_name", "interval", "bucket_start"),
+        # Хранение удаляет минутные свечи старше срока: WHERE interval = ? AND bucket_start < ?
+        Index("ix_resource_price_candles_interval_bucket_start", "interval", "bucket_start"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    resource_name: Mapped[str]
+    interval: Mapped[str]  # "1m", "1h" или "1d"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime)
+    open: Mapped[float]
+    high: Mapped[float]
+    low: Mapped[float]
+    close: Mapped[float]
+    count: Mapped[int]
@@ -1,6 +1,90 @@
-from sqlalchemy import select, update, delete
-from src.resources.models import ResourceOrm, ResourcePriceHistoryOrm
-from src.db import Session_maker
+import asyncio
+import secrets
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from sqlalchemy import Connection, Row, select, update, delete, insert, func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.resources.models import ResourceOrm, ResourcePriceHistoryOrm, ResourcePriceCandleOrm, MarketStateOrm
+from src.db import engine, Session_maker, Async_session_maker
+from src.ledger.repository import LedgerRepository
+
+CANDLE_INTERVALS = {
+    "1m": timedelta(minutes=1),
+    "1h": timedelta(hours=1),
+    "1d": timedelta(days=1),
+}
+
+def candle_bucket(timestamp: datetime, interval: str) -> datetime:
+    step = CANDLE_INTERVALS[interval]
+    return datetime.min + (timestamp - datetime.min) // step * step
+
+def snapshot_statements(prices: dict[str, float], timestamp: datetime) -> list:
+    """INSERT снимка в историю и дополнение свечей всех интервалов (выполняются в одной транзакции)"""
+    history = insert(ResourcePriceHistoryOrm).values(
+        [{"resource_name": name, "price": price, "timestamp": timestamp} for name, price in prices.items()]
+    )
+    candles = sqlite_insert(ResourcePriceCandleOrm).values([
+        {"resource_name": name, "interval": interval, "bucket_start": candle_bucket(timestamp, interval),
+         "open": price, "high": price, "low": price, "close": price, "count": 1}
+        for name, price in prices.items() for interval in CANDLE_INTERVALS
+    ])
+    candles = candles.on_conflict_do_update(
+        index_elements=["resource_name", "interval", "bucket_start"],
+        set_={
+            "high": func.max(ResourcePriceCandleOrm.high, candles.excluded.high),
+            "low": func.min(ResourcePriceCandleOrm.low, candles.excluded.low),
+            "close": candles.excluded.close,
+            "count": ResourcePriceCandleOrm.count + 1,
+        },
+    )
+    # Новый снимок меняет /history: версия рынка растет в той же транзакции
+    version = update(MarketStateOrm).values(version=MarketStateOrm.version + 1)
+    return [history, candles, version]
+
+class MarketStateRepository:
+    @staticmethod
+    def load(session: Session) -> MarketStateOrm:
+        """Состояние рынка в транзакции вызывающего (создается, если его нет)"""
+        state = session.scalar(select(MarketStateOrm))
+        if state is None:
+            MarketStateRepository.ensure(session.connection())
+            state = session.scalar(select(MarketStateOrm))
+        return state
+
+    @staticmethod
+    def ensure(conn: Connection) -> None:
+        # Несколько воркеров могут создавать строку одновременно: вставка без конфликта
+        conn.execute(sqlite_insert(MarketStateOrm).values(id=1, epoch=secrets.token_hex(4)).on_conflict_do_nothing())
+
+    @staticmethod
+    def bump(session: Session, rates: bool = False) -> None:
+        """Новая версия рынка в транзакции изменения: ETag меняется вместе с данными (строку создает миграция)"""
+        values = {"version": MarketStateOrm.version + 1}
+        if rates:
+            values["rates_version"] = MarketStateOrm.rates_version + 1
+        session.execute(update(MarketStateOrm).values(**values))
+
+    @classmethod
+    def get(cls) -> MarketStateOrm:
+        with Session_maker() as session:
+            state = cls.load(session)
+            session.commit()
+            return state
+
+class AsyncMarketStateRepository:
+    @classmethod
+    async def get(cls) -> MarketStateOrm:
+        async with Async_session_maker() as session:
+            state = await session.run_sync(MarketStateRepository.load)
+            await session.commit()
+            return state
+
+    @classmethod
+    async def bump(cls, rates: bool = False) -> None:
+        async with Async_session_maker() as session:
+            await session.run_sync(MarketStateRepository.bump, rates)
+            await session.commit()
 
 class ResourceRepository:
     @classmethod
@@ -8,6 +92,8 @@ class ResourceRepository:
         with Session_maker() as session:
             new_resource = ResourceOrm(**value)
             session.add(new_resource)
+            LedgerRepository.append(session, "resource_add", resource=value["name"], resource_delta=value["amount"])
+            MarketStateRepository.bump(session, rates=True)
             session.commit()
             session.refresh(new_resource)
             return new_resource
@@ -29,6 +115,9 @@ class ResourceRepository:
     @classmethod
     def update(cls, resource_id: int, value: dict) -> int:
         with Session_maker() as session:
+            if "amount" in value:
+                ResourceRepository.record_change(session, resource_id, "resource_edit", value["amount"])
+                MarketStateRepository.bump(session)
             query = update(ResourceOrm).where(ResourceOrm.id == resource_id).values(**value)
             ret = session.execute(query)
             session.commit()
@@ -37,11 +126,81 @@ class ResourceRepository:
     @classmethod
     def delete(cls, resource_id: int) -> int:
         with Session_maker() as session:
+            ResourceRepository.record_change(session, resource_id, "resource_delete", 0)
             query = delete(ResourceOrm).where(ResourceOrm.id == resource_id)
             ret = session.execute(query)
+            MarketStateRepository.bump(session, rates=True)
             session.commit()
             return ret.rowcount
 
+    @staticmethod
+    def backfill_candles(conn: Connection) -> None:
+        """
+        Сворачивает в свечи сырую историю, записанную до появления свечей: без этого хранение удалило бы
+        старые точки без свертки. Каждый снимок после появления свечей учтен в count свечи своего бакета,
+        поэтому в бакете со свечой досчитываются только первые (точек - count) точек
+        """
+        names = conn.scalars(select(ResourcePriceHistoryOrm.resource_name).distinct()).all()
+        for name in names:
+            query = select(ResourcePriceHistoryOrm.price, ResourcePriceHistoryOrm.timestamp) \
+                .where(ResourcePriceHistoryOrm.resource_name == name, ResourcePriceHistoryOrm.timestamp.is_not(None)) \
+                .order_by(ResourcePriceHistoryOrm.timestamp, ResourcePriceHistoryOrm.id)
+            existing = select(ResourcePriceCandleOrm.interval, ResourcePriceCandleOrm.bucket_start,
+                              ResourcePriceCandleOrm.count).filter_by(resource_name=name)
+            # Свечи пишутся с первого снимка после их появления: точки позже первого дневного бакета
+            # уже свернуты, их не перечитываем
+            first_day = conn.scalar(select(func.min(ResourcePriceCandleOrm.bucket_start)).filter_by(
+                resource_name=name, interval="1d"
+            ))
+            if first_day is not None:
+                query = query.where(ResourcePriceHistoryOrm.timestamp < first_day + CANDLE_INTERVALS["1d"])
+                existing = existing.where(ResourcePriceCandleOrm.bucket_start < first_day + CANDLE_INTERVALS["1d"])
+            folded = {(interval, bucket_start): count for interval, bucket_start, count in conn.execute(existing)}
+            buckets: dict[tuple[str, datetime], list[float]] = {}
+            for price, timestamp in conn.execute(query):
+                for interval in CANDLE_INTERVALS:
+                    buckets.setdefault((interval, candle_bucket(timestamp, interval)), []).append(price)
+            candles = []
+            for (interval, bucket_start), prices in buckets.items():
+                # Минутная свеча могла быть удалена хранением: тогда ее бакет сворачивается заново целиком
+                missing = prices[:max(0, len(prices) - folded.get((interval, bucket_start), 0))]
+                if missing:
+                    candles.append({
+                        "resource_name": name, "interval": interval, "bucket_start": bucket_start,
+                        "open": missing[0], "high": max(missing), "low": min(missing), "close": missing[-1],
+                        "count": len(missing),
+                    })
+            if candles:
+                upsert = sqlite_insert(ResourcePriceCandleOrm)
+                # Досчитанные точки старше всех учтенных в свече: open - от них, close остается за свечой
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=["resource_name", "interval", "bucket_start"],
+                    set_={
+                        "open": upsert.excluded.open,
+                        "high": func.max(ResourcePriceCandleOrm.high, upsert.excluded.high),
+                        "low": func.min(ResourcePriceCandleOrm.low, upsert.excluded.low),
+                        "count": ResourcePriceCandleOrm.count + upsert.excluded.count,
+                    },
+                )
+                conn.execute(upsert, candles)
+
+    @staticmethod
+    def record_change(session: Session, resource_id: int, kind: str, amount: int) -> None:
+        """Запись журнала об установке количества ресурса в amount (удаление - в 0), до самого изменения"""
+        old_amount = select(ResourceOrm.amount).where(ResourceOrm.id == resource_id).scalar_subquery()
+        name = select(ResourceOrm.name).where(ResourceOrm.id == resource_id).scalar_subquery()
+        LedgerRepository.append(session, kind, resource=name, resource_delta=amount - func.coalesce(old_amount, amount))
+
+    @staticmethod
+    def rates(session: Session) -> dict[str, float]:
+        """Курсы всех ресурсов в транзакции вызывающего"""
+        return dict(session.execute(select(ResourceOrm.name, ResourceOrm.base_rate)).tuples().all())
+
+    @staticmethod
+    def stock(session: Session) -> dict[str, int]:
+        """Запасы всех ресурсов в транзакции вызывающего"""
+        return dict(session.execute(select(ResourceOrm.name, ResourceOrm.amount).order_by(ResourceOrm.id)).tuples().all())
+
     @classmethod
     def add_price_history(cls, value: dict) -> ResourcePriceHistoryOrm:
         with Session_maker() as session:
@@ -51,9 +210,186 @@ class ResourceRepository:
             session.refresh(new_history)
             return new_history
 
+    @classmethod
+    def add_price_snapshot(cls, prices: dict[str, float], timestamp: datetime) -> None:
+        """Записывает цены всех ресурсов одним многострочным INSERT с общей меткой времени"""
+        if not prices:
+            return
+        with Session_maker() as session:
+            for query in snapshot_statements(prices, timestamp):
+                session.execute(query)
+            session.commit()
+
     @classmethod
     def get_price_history(cls, resource_name: str, limit: int = 20) -> list[ResourcePriceHistoryOrm]:
         with Session_maker() as session:
             query = select(ResourcePriceHistoryOrm).filter_by(resource_name=resource_name).order_by(ResourcePriceHistoryOrm.timestamp.desc()).limit(limit)
             result = session.scalars(query)
             return result.all()
+
+    @classmethod
+    def incremental_vacuum(cls, pages: int) -> int:
+        """Возвращает до pages свободных страниц файловой системе; результат - сколько свободных осталось"""
+        connection = engine.raw_connection()
+        try:
+            # sqlite3 делает один шаг на execute, а incremental_vacuum освобождает по странице за шаг:
+            # executescript выполняет оператор до конца
+            connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return connection.driver_connection.execute("PRAGMA freelist_count").fetchone()[0]
+        finally:
+            connection.close()
+
+class AsyncResourceRepository:
+    @classmethod
+    async def add(cls, value: dict) -> ResourceOrm:
+        async with Async_session_maker() as session:
+            new_resource = ResourceOrm(**value)
+            session.add(new_resource)
+            await session.run_sync(
+                LedgerRepository.append, "resource_add", resource=value["name"], resource_delta=value["amount"]
+            )
+            await session.run_sync(MarketStateRepository.bump, True)
+            await session.commit()
+            await session.refresh(new_resource)
+            return new_resource
+
+    @classmethod
+    async def find(cls, filter_by: dict) -> ResourceOrm:
+        async with Async_session_maker() as session:
+            query = select(ResourceOrm).filter_by(**filter_by)
+            result = await session.scalar(query)
+            return result
+
+    @classmethod
+    async def all(cls) -> list[ResourceOrm]:
+        async with Async_session_maker() as session:
+            query = select(ResourceOrm)
+            result = await session.scalars(query)
+            return result.all()
+
+    @classmethod
+    async def update(cls, resource_id: int, value: dict) -> int:
+        async with Async_session_maker() as session:
+            if "amount" in value:
+                await session.run_sync(ResourceRepository.record_change, resource_id, "resource_edit", value["amount"])
+                await session.run_sync(MarketStateRepository.bump)
+            query = update(ResourceOrm).where(ResourceOrm.id == resource_id).values(**value)
+            ret = await session.execute(query)
+            await session.commit()
+            return ret.rowcount
+
+    @classmethod
+    async def delete(cls, resource_id: int) -> int:
+        async with Async_session_maker() as session:
+            await session.run_sync(ResourceRepository.record_change, resource_id, "resource_delete", 0)
+            query = delete(ResourceOrm).where(ResourceOrm.id == resource_id)
+            ret = await session.execute(query)
+            await session.run_sync(MarketStateRepository.bump, True)
+            await session.commit()
+            return ret.rowcount
+
+    @classmethod
+    async def rates(cls) -> dict[str, float]:
+        async with Async_session_maker() as session:
+            return await session.run_sync(ResourceRepository.rates)
+
+    @classmethod
+    async def update_base_rate(cls, resource_id: int, base_rate: float) -> int:
+        """Меняет курс и версию курсов одной транзакцией, чтобы другие воркеры перечитали курсы"""
+        async with Async_session_maker() as session:
+            query = update(ResourceOrm).where(ResourceOrm.id == resource_id).values(base_rate=base_rate)
+            ret = await session.execute(query)
+            await session.run_sync(MarketStateRepository.bump, True)
+            await session.commit()
+            return ret.rowcount
+
+    @classmethod
+    async def add_price_snapshot(cls, prices: dict[str, float], timestamp: datetime) -> None:
+        if not prices:
+            return
+        async with Async_session_maker() as session:
+            for query in snapshot_statements(prices, timestamp):
+                await session.execute(query)
+            await session.commit()
+
+    @classmethod
+    async def get_price_history(cls, resource_name: str, limit: int = 20) -> list[ResourcePriceHistoryOrm]:
+        async with Async_session_maker() as session:
+            query = select(ResourcePriceHistoryOrm).filter_by(resource_name=resource_name).order_by(ResourcePriceHistoryOrm.timestamp.desc()).limit(limit)
+            result = await session.scalars(query)
+            return result.all()
+
+    @classmethod
+    async def get_candles(cls, resource_name: str, interval: str, start: datetime | None = None,
+                          end: datetime | None = None, limit: int = 500) -> list[ResourcePriceCandleOrm]:
+        async with Async_session_maker() as session:
+            query = select(ResourcePriceCandleOrm).filter_by(resource_name=resource_name, interval=interval)
+            if start is not None:
+                query = query.where(ResourcePriceCandleOrm.bucket_start >= candle_bucket(start, interval))
+            if end is not None:
+                query = query.where(ResourcePriceCandleOrm.bucket_start <= end)
+            if start is not None:
+                query = query.order_by(ResourcePriceCandleOrm.bucket_start).limit(limit)
+                result = await session.scalars(query)
+                return result.all()
+            # Без начала периода отдаем последние limit свечей по возрастанию времени
+            query = query.order_by(ResourcePriceCandleOrm.bucket_start.desc()).limit(limit)
+            result = await session.scalars(query)
+            return result.all()[::-1]
+
+    @classmethod
+    async def stream_price_history(cls, resource_name: str | None = None, after_id: int = 0,
+                                   since: datetime | None = None, limit: int | None = None,
+                                   batch_size: int = 1000) -> AsyncIterator[list[Row]]:
+        """Отдает историю пачками по batch_size строк через серверный курсор, по возрастанию id"""
+        query = select(
+            ResourcePriceHistoryOrm.id,
+            ResourcePriceHistoryOrm.resource_name,
+            ResourcePriceHistoryOrm.price,
+            ResourcePriceHistoryOrm.timestamp,
+        ).where(ResourcePriceHistoryOrm.id > after_id).order_by(ResourcePriceHistoryOrm.id)
+        if resource_name is not None:
+            query = query.where(ResourcePriceHistoryOrm.resource_name == resource_name)
+        if since is not None:
+            query = query.where(ResourcePriceHistoryOrm.timestamp >= since)
+        if limit is not None:
+            query = query.limit(limit)
+        async with Async_session_maker() as session:
+            result = await session.stream(query.execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                yield partition
+
+    @classmethod
+    async def delete_history_batch(cls, cutoff: datetime, batch_size: int) -> tuple[int, bool]:
+        """
+        Удаляет до batch_size самых старых строк истории старше cutoff одной короткой транзакцией.
+        Строки пишутся по времени, поэтому идем по id и останавливаемся на первой свежей;
+        возвращает (удалено, есть ли еще что удалять)
+        """
+        async with Async_session_maker() as session:
+            query = select(ResourcePriceHistoryOrm.id, ResourcePriceHistoryOrm.timestamp) \
+                .order_by(ResourcePriceHistoryOrm.id).limit(batch_size)
+            rows = (await session.execute(query)).all()
+            ids = [row.id for row in rows if row.timestamp < cutoff]
+            if ids:
+                # Диапазон по первичному ключу вместо длинного IN; условие по времени страхует от неупорядоченных строк
+                await session.execute(delete(ResourcePriceHistoryOrm).where(
+                    ResourcePriceHistoryOrm.id.between(ids[0], ids[-1]), ResourcePriceHistoryOrm.timestamp < cutoff
+                ))
+                await session.commit()
+            return len(ids), len(ids) == batch_size
+
+    @classmethod
+    async def delete_candles_batch(cls, interval: str, cutoff: datetime, batch_size: int) -> tuple[int, bool]:
+        """То же для свечей одного интервала: самые старые по bucket_start, по индексу (interval, bucket_start)"""
+        async with Async_session_maker() as session:
+            oldest = select(ResourcePriceCandleOrm.id).filter_by(interval=interval) \
+                .where(ResourcePriceCandleOrm.bucket_start < cutoff) \
+                .order_by(ResourcePriceCandleOrm.bucket_start).limit(batch_size)
+            ret = await session.execute(delete(ResourcePriceCandleOrm).where(ResourcePriceCandleOrm.id.in_(oldest)))
+            await session.commit()
+            return ret.rowcount, ret.rowcount == batch_size
+
+    @classmethod
+    async def incremental_vacuum(cls, pages: int) -> int:
+        return await asyncio.to_thread(ResourceRepository.incremental_vacuum, pages)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.config import settings
+from src.resources.repository import AsyncResourceRepository, AsyncMarketStateRepository
+
+logger = logging.getLogger(__name__)
+
+
+async def _delete_in_batches(delete_batch) -> int:
+    deleted, more = 0, True
+    while more:
+        count, more = await delete_batch()
+        deleted += count
+        # Между пачками отдаем цикл событий и блокировку записи сделкам
+        await asyncio.sleep(0)
+    return deleted
+
+
+async def compact_history(now: datetime | None = None) -> dict:
+    """
+    Один проход хранения: удаляет сырые точки истории старше HISTORY_RETENTION_DAYS и минутные свечи
+    старше CANDLE_1M_RETENTION_DAYS короткими транзакциями, затем освобождает место в файле.
+    Часовые и дневные свечи уже содержат свертку удаляемых точек: они дополняются при каждом снимке.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    batch_size = settings.COMPACTION_BATCH_SIZE
+    history_cutoff = now - timedelta(days=settings.HISTORY_RETENTION_DAYS)
+    candle_cutoff = now - timedelta(days=settings.CANDLE_1M_RETENTION_DAYS)
+
+    history_deleted = await _delete_in_batches(
+        lambda: AsyncResourceRepository.delete_history_batch(history_cutoff, batch_size)
+    )
+    candles_deleted = await _delete_in_batches(
+        lambda: AsyncResourceRepository.delete_candles_batch("1m", candle_cutoff, batch_size)
+    )
+    if history_deleted or candles_deleted:
+        await AsyncMarketStateRepository.bump()
+
+    free_pages = await AsyncResourceRepository.incremental_vacuum(settings.COMPACTION_VACUUM_PAGES)
+    while free_pages:
+        await asyncio.sleep(0)
+        remaining = await AsyncResourceRepository.incremental_vacuum(settings.COMPACTION_VACUUM_PAGES)
+        if remaining >= free_pages:
+            # auto_vacuum выключен у базы, созданной до профиля с INCREMENTAL: страницы не освобождаются
+            break
+        free_pages = remaining
+    return {
+        "history_deleted": history_deleted,
+        "candles_deleted": candles_deleted,
+        "free_pages": free_pages,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def compaction_loop() -> None:
+    """Фоновая задача приложения: проход хранения раз в COMPACTION_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await compact_history()
+        except Exception:
+            # Например, database is locked: следующий проход повторит очистку, задача не должна умирать
+            logger.exception("History compaction failed")
+        await asyncio.sleep(settings.COMPACTION_INTERVAL_SECONDS)
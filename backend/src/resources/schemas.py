@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, List
+from typing import List
 from datetime import datetime
 
 class ResourcePriceSchema(BaseModel):
@@ -19,3 +19,27 @@ class ResourcePriceHistorySchema(BaseModel):
 class ResourcePriceHistoryResponse(BaseModel):
     resource_name: str
     history: List[ResourcePriceHistorySchema]
+
+class ResourceCandleSchema(BaseModel):
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+
+class ResourceCandlesResponse(BaseModel):
+    resource_name: str
+    interval: str
+    candles: List[ResourceCandleSchema]
+
+class ResourceQuoteSchema(BaseModel):
+    name: str
+    price: float
+    amount: int
+    deposit_earned: List[float]
+    withdraw_cost: List[float]
+
+class ResourceQuotesResponse(BaseModel):
+    quantities: List[int]
+    quotes: List[ResourceQuoteSchema]
@@ -1,14 +1,69 @@
 from src.resources.calc import ResourceCalculator
-from src.resources.repository import ResourceRepository
-from src.resources.schemas import ResourcePriceSchema, ResourcePriceHistorySchema, ResourcePriceHistoryResponse
+from src.resources.feed import price_feed
+from src.resources.repository import (
+    ResourceRepository, AsyncResourceRepository, MarketStateRepository,
+)
+from src.resources.schemas import (
+    ResourcePriceSchema, ResourcePriceHistorySchema, ResourcePriceHistoryResponse,
+    ResourceCandleSchema, ResourceCandlesResponse,
+)
 from src.resources.models import ResourceOrm
-from src.clients.service import BankAccountService
+from src.clients.repository import MoneySupplyRepository
+from src.db import Session_maker, Async_session_maker, begin_read
+from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime, timezone
+
+class MarketService:
+    @classmethod
+    def read(cls, session: Session) -> float:
+        """Денежная масса в транзакции вызывающего; при смене версии курсов перечитывает их в кэш процесса"""
+        state = MarketStateRepository.load(session)
+        if state.rates_version != ResourceCalculator.rates_version:
+            ResourceCalculator.set_rates(state.rates_version, ResourceRepository.rates(session))
+        return MoneySupplyRepository.read(session)
+
+    @classmethod
+    def total(cls) -> float:
+        with Session_maker() as session:
+            total = cls.read(session)
+            session.commit()
+            return total
+
+    @classmethod
+    def read_stock(cls, session: Session) -> tuple[dict[str, int], float]:
+        """Запасы ресурсов и денежная масса из одного снимка базы: цены не смешивают состояния до и после сделки"""
+        begin_read(session)
+        total = cls.read(session)
+        return ResourceRepository.stock(session), total
+
+    @classmethod
+    def stock(cls) -> tuple[dict[str, int], float]:
+        with Session_maker() as session:
+            stock, total = cls.read_stock(session)
+            session.commit()
+            return stock, total
+
+class AsyncMarketService:
+    @classmethod
+    async def total(cls) -> float:
+        async with Async_session_maker() as session:
+            total = await session.run_sync(MarketService.read)
+            await session.commit()
+            return total
+
+    @classmethod
+    async def stock(cls) -> tuple[dict[str, int], float]:
+        async with Async_session_maker() as session:
+            stock, total = await session.run_sync(MarketService.read_stock)
+            await session.commit()
+            return stock, total
 
 class ResourceService:
     @classmethod
-    def add(cls, resource: ResourcePriceSchema) -> ResourcePriceSchema:
+    def add(cls, resource: ResourcePriceSchema, base_rate: float | None = None) -> ResourcePriceSchema:
         value = resource.model_dump(exclude={"price"})
+        value["base_rate"] = ResourceCalculator.DEFAULT_BASE_RATES.get(resource.name, 1) if base_rate is None else base_rate
         db_resource = ResourceRepository.add(value)
         return ResourcePriceSchema(name=db_resource.name, price=0, amount=db_resource.amount)
 
@@ -61,10 +116,108 @@ class ResourceHistoryService:
         return ResourcePriceHistoryResponse(resource_name=resource_name, history=history)
 
     @classmethod
-    def update_all_prices_history(cls, clients: list) -> None:
+    def update_all_prices_history(cls) -> None:
         """Обновляет историю цен для всех ресурсов одновременно"""
-        total_dollars = ResourceCalculator.get_total_dollars(clients)
-        resources = ResourceService.all()
-        for res in resources:
-            price = ResourceCalculator.get_resource_price(res.name, res.amount, total_dollars)
-            cls.add_price_history(res.name, price)
+        stock, total_dollars = MarketService.stock()
+        total_dollars = int(total_dollars)
+        prices = {
+            name: ResourceCalculator.get_resource_price(name, amount, total_dollars)
+            for name, amount in stock.items()
+        }
+        ResourceRepository.add_price_snapshot(prices, datetime.now(timezone.utc).replace(tzinfo=None))
+
+class AsyncResourceService:
+    @classmethod
+    async def add(cls, resource: ResourcePriceSchema, base_rate: float | None = None) -> ResourcePriceSchema:
+        value = resource.model_dump(exclude={"price"})
+        value["base_rate"] = ResourceCalculator.DEFAULT_BASE_RATES.get(resource.name, 1) if base_rate is None else base_rate
+        db_resource = await AsyncResourceRepository.add(value)
+        return ResourcePriceSchema(name=db_resource.name, price=0, amount=db_resource.amount)
+
+    @classmethod
+    async def find(cls, name: str) -> ResourcePriceSchema | None:
+        db_resource = await AsyncResourceRepository.find({"name": name})
+        if db_resource:
+            return ResourcePriceSchema(name=db_resource.name, price=0, amount=db_resource.amount)
+        return None
+
+    @classmethod
+    async def find_db(cls, name: str) -> ResourceOrm | None:
+        return await AsyncResourceRepository.find({"name": name})
+
+    @classmethod
+    async def all(cls) -> List[ResourcePriceSchema]:
+        return [ResourcePriceSchema(name=elem.name, price=0, amount=elem.amount) for elem in await AsyncResourceRepository.all()]
+
+    @classmethod
+    async def prices(cls) -> List[ResourcePriceSchema]:
+        """Текущие цены всех ресурсов"""
+        stock, total_dollars = await AsyncMarketService.stock()
+        total_dollars = int(total_dollars)
+        return [
+            ResourcePriceSchema(
+                name=name,
+                price=ResourceCalculator.get_resource_price(name, amount, total_dollars),
+                amount=amount
+            ) for name, amount in stock.items()
+        ]
+
+    @classmethod
+    async def update(cls, resource_id: int, amount: int) -> int:
+        return await AsyncResourceRepository.update(resource_id, {"amount": amount})
+
+    @classmethod
+    async def delete(cls, resource_id: int) -> int:
+        return await AsyncResourceRepository.delete(resource_id)
+
+    @classmethod
+    async def base_rates(cls) -> dict[str, float]:
+        return await AsyncResourceRepository.rates()
+
+    @classmethod
+    async def update_base_rate(cls, resource_id: int, base_rate: float) -> int:
+        return await AsyncResourceRepository.update_base_rate(resource_id, base_rate)
+
+class AsyncResourceHistoryService:
+    @classmethod
+    async def get_price_history(cls, resource_name: str, limit: int = 20) -> ResourcePriceHistoryResponse:
+        db_history = await AsyncResourceRepository.get_price_history(resource_name, limit)
+        history = [
+            ResourcePriceHistorySchema(
+                id=item.id,
+                resource_name=item.resource_name,
+                price=item.price,
+                timestamp=item.timestamp
+            ) for item in db_history
+        ]
+        return ResourcePriceHistoryResponse(resource_name=resource_name, history=history)
+
+    @classmethod
+    def stream_price_history(cls, resource_name: str | None = None, after_id: int = 0,
+                             since: datetime | None = None, limit: int | None = None):
+        """Пачки строк (id, resource_name, price, timestamp) для потоковой выгрузки"""
+        return AsyncResourceRepository.stream_price_history(resource_name, after_id, since, limit)
+
+    @classmethod
+    async def get_candles(cls, resource_name: str, interval: str, start: datetime | None = None,
+                          end: datetime | None = None, limit: int = 500) -> ResourceCandlesResponse:
+        db_candles = await AsyncResourceRepository.get_candles(resource_name, interval, start, end, limit)
+        candles = [
+            ResourceCandleSchema(
+                bucket_start=item.bucket_start,
+                open=item.open,
+                high=item.high,
+                low=item.low,
+                close=item.close,
+                count=item.count
+            ) for item in db_candles
+        ]
+        return ResourceCandlesResponse(resource_name=resource_name, interval=interval, candles=candles)
+
+    @classmethod
+    async def update_all_prices_history(cls) -> None:
+        """Обновляет историю цен для всех ресурсов одновременно и рассылает кадр подписчикам"""
+        prices = await AsyncResourceService.prices()
+        timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        await AsyncResourceRepository.add_price_snapshot({res.name: res.price for res in prices}, timestamp)
+        price_feed.publish([res.model_dump() for res in prices], timestamp)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+
+from src.config import settings
+from src.metrics.registry import metrics
+from src.resources.service import AsyncResourceHistoryService
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotWriter:
+    """
+    Фоновая запись снимков истории цен: все изменения рынка за окно coalesce_seconds
+    сворачиваются в один снимок, который пишется после ответа клиенту.
+    Пока задача не запущена (скрипты, бенчмарки без lifespan), снимок пишется сразу.
+    """
+
+    def __init__(self, coalesce_seconds: float):
+        self.coalesce_seconds = coalesce_seconds
+        self.pending = 0  # Изменений рынка, ждущих снимка
+        self.requested = 0
+        self.written = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def schedule(self) -> None:
+        self.requested += 1
+        metrics.snapshot_requests.inc()
+        if not self.running or self.coalesce_seconds <= 0:
+            await self._write()
+            return
+        self.pending += 1
+        metrics.snapshot_queue_depth.inc()
+        self._wakeup.set()
+
+    def start(self) -> None:
+        # Event создаются в цикле событий приложения
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает задачу и дописывает ожидающий снимок (вызывается из lifespan).
+        Идущая запись не прерывается: задача завершается сама после текущего прохода.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        if self.pending:
+            await self._flush()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            await self._wakeup.wait()
+            try:
+                # Окно объединения; остановка прерывает только ожидание, не запись
+                await asyncio.wait_for(self._stopping.wait(), self.coalesce_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._flush()
+            except Exception:
+                # Снимок повторится при следующем изменении рынка или при остановке; задача не должна умирать
+                logger.exception("Price snapshot write failed")
+
+    async def _flush(self) -> None:
+        self._wakeup.clear()
+        if not self.pending:
+            return
+        # Изменения, пришедшие во время записи, остаются в pending и будят следующий проход
+        flushed = self.pending
+        await self._write()
+        self.pending -= flushed
+        metrics.snapshot_queue_depth.dec((), flushed)
+
+    async def _write(self) -> None:
+        started = time.perf_counter()
+        # Цены считаются в момент записи, поэтому снимок отражает все свернутые изменения
+        await AsyncResourceHistoryService.update_all_prices_history()
+        self.written += 1
+        metrics.snapshots_written.inc()
+        metrics.snapshot_write_time.observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "coalesce_seconds": self.coalesce_seconds,
+            "pending": self.pending,
+            "requested": self.requested,
+            "written": self.written,
+        }
+
+
+snapshot_writer = SnapshotWriter(coalesce_seconds=settings.SNAPSHOT_COALESCE_MS / 1000)
@@ -0,0 +1,18 @@
+from typing import List, Literal
+from pydantic import BaseModel
+
+class TradeResultSchema(BaseModel):
+    player: str
+    resource: str
+    amount: int
+    money: float  # Начислено клиенту (депозит) или списано с клиента (снятие)
+
+class TradeRequestSchema(BaseModel):
+    kind: Literal["deposit", "withdraw"]
+    player: str
+    resource: str
+    amount: int
+
+class TradeBatchResponse(BaseModel):
+    status: str
+    results: List[TradeResultSchema]
@@ -0,0 +1,220 @@
+from collections import defaultdict
+
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.orm import Session
+
+from src.clients.models import ClientBalanceOrm, BankAccountOrm
+from src.clients.repository import BankAccountRepository
+from src.db import Session_maker, Async_session_maker, begin_write, begin_write_async
+from src.ledger.repository import LedgerRepository
+from src.resources.calc import ResourceCalculator
+from src.resources.models import ResourceOrm
+from src.resources.repository import MarketStateRepository
+from src.resources.service import MarketService
+from src.trade.schemas import TradeResultSchema, TradeRequestSchema
+
+
+class TradeError(ValueError):
+    """Сделка отклонена, транзакция откатывается"""
+    status_code = 400
+
+class TradeNotFoundError(TradeError):
+    status_code = 404
+
+
+class TradeService:
+    """Проводит сделку целиком в одной транзакции: чтение, расчет цены и запись балансов"""
+
+    @classmethod
+    def deposit(cls, player: str, resource: str, amount: int) -> TradeResultSchema:
+        with Session_maker() as session:
+            begin_write(session)
+            result = cls.apply_deposit(session, player, resource, amount)
+            session.commit()
+            return result
+
+    @classmethod
+    def withdraw(cls, player: str, resource: str, amount: int) -> TradeResultSchema:
+        with Session_maker() as session:
+            begin_write(session)
+            result = cls.apply_withdraw(session, player, resource, amount)
+            session.commit()
+            return result
+
+    @classmethod
+    def batch(cls, trades: list[TradeRequestSchema]) -> list[TradeResultSchema]:
+        with Session_maker() as session:
+            begin_write(session)
+            results = cls.apply_batch(session, trades)
+            session.commit()
+            return results
+
+    @classmethod
+    def apply_batch(cls, session: Session, trades: list[TradeRequestSchema]) -> list[TradeResultSchema]:
+        """
+        Проводит сделки по порядку против состояния рынка в памяти: строки читаются один раз,
+        суммарные сдвиги балансов пишутся одним UPDATE на таблицу. Любая отклоненная сделка отменяет весь пакет.
+        """
+        if not trades:
+            return []
+        players = {trade.player for trade in trades}
+        resources = {trade.resource for trade in trades}
+        clients = {c.name: c for c in session.scalars(
+            select(ClientBalanceOrm).where(ClientBalanceOrm.name.in_(players)).with_for_update()
+        )}
+        stock = {r.name: r for r in session.scalars(
+            select(ResourceOrm).where(ResourceOrm.name.in_(resources)).with_for_update()
+        )}
+        bank_account = BankAccountRepository.load(session)
+        # Сделки переводят деньги между банком и клиентами, денежная масса в пакете не меняется
+        total_dollars = int(MarketService.read(session))
+
+        balances = {name: c.balance for name, c in clients.items()}
+        amounts = {name: r.amount for name, r in stock.items()}
+        bank_balance = bank_account.balance
+        client_deltas = defaultdict(float)
+        resource_deltas = defaultdict(int)
+        results = []
+        entries = []
+        for i, trade in enumerate(trades, start=1):
+            if trade.player not in balances or trade.resource not in amounts:
+                raise TradeNotFoundError(f"Сделка #{i}: клиент или ресурс не найден")
+            current_amount = amounts[trade.resource]
+            if trade.kind == "deposit":
+                money = ResourceCalculator.calc_deposit_earned(trade.resource, current_amount, trade.amount, total_dollars)
+                if bank_balance < money:
+                    raise TradeError(f"Сделка #{i}: недостаточно средств в банке. Доступно: {bank_balance}, требуется: {money}")
+                client_delta, resource_delta = money, trade.amount
+            else:
+                if current_amount < trade.amount:
+                    raise TradeError(f"Сделка #{i}: недостаточно ресурса в банке")
+                money = ResourceCalculator.calc_withdraw_cost(trade.resource, current_amount, trade.amount, total_dollars)
+                if balances[trade.player] < money:
+                    raise TradeError(f"Сделка #{i}: недостаточно $ на счёте")
+                client_delta, resource_delta = -money, -trade.amount
+            balances[trade.player] += client_delta
+            bank_balance -= client_delta
+            amounts[trade.resource] = current_amount + resource_delta
+            client_deltas[trade.player] += client_delta
+            resource_deltas[trade.resource] += resource_delta
+            entries.append({"kind": trade.kind, "player": trade.player, "resource": trade.resource,
+                            "client_delta": client_delta, "bank_delta": -client_delta, "resource_delta": resource_delta})
+            results.append(TradeResultSchema(player=trade.player, resource=trade.resource, amount=trade.amount, money=money))
+
+        # Как и одиночные сделки, пишем сдвиги относительно значения в строке с проверкой на отрицательный
+        # остаток в самом UPDATE: итог не зависит от того, что строки не менялись после чтения
+        cls._shift(session, ClientBalanceOrm.__table__.c.balance, ClientBalanceOrm.__table__.c.id,
+                   {clients[name].id: delta for name, delta in client_deltas.items()})
+        cls._shift(session, ResourceOrm.__table__.c.amount, ResourceOrm.__table__.c.id,
+                   {stock[name].id: delta for name, delta in resource_deltas.items()})
+        cls._shift(session, BankAccountOrm.__table__.c.balance, BankAccountOrm.__table__.c.id,
+                   {bank_account.id: -sum(client_deltas.values())})
+        # Запись журнала на каждую сделку пакета, одним executemany
+        LedgerRepository.append_many(session, entries)
+        MarketStateRepository.bump(session)
+        return results
+
+    @staticmethod
+    def _shift(session: Session, column, id_column, deltas: dict[int, float]) -> None:
+        """column += delta по строкам одним executemany; отрицательный сдвиг не уводит значение ниже нуля"""
+        delta = bindparam("delta")
+        ret = session.execute(
+            update(column.table)
+            .where(id_column == bindparam("row_id"), or_(delta >= 0, column + delta >= 0))
+            .values({column: column + delta}),
+            [{"row_id": row_id, "delta": value} for row_id, value in deltas.items()],
+        )
+        if ret.rowcount != len(deltas):
+            raise TradeError("Пакет отклонен: баланс или запас изменились во время проведения")
+
+    @classmethod
+    def apply_deposit(cls, session: Session, player: str, resource: str, amount: int) -> TradeResultSchema:
+        client_db, resource_db, bank_account = cls._lock(session, player, resource)
+        total_dollars = int(MarketService.read(session))
+        earned = ResourceCalculator.calc_deposit_earned(resource_db.name, resource_db.amount, amount, total_dollars)
+        # Списываем деньги с банковского счета
+        ret = session.execute(
+            update(BankAccountOrm)
+            .where(BankAccountOrm.id == bank_account.id, BankAccountOrm.balance >= earned)
+            .values(balance=BankAccountOrm.balance - earned)
+        )
+        if ret.rowcount == 0:
+            raise TradeError(f"Недостаточно средств в банке. Доступно: {bank_account.balance}, требуется: {earned}")
+        session.execute(
+            update(ResourceOrm).where(ResourceOrm.id == resource_db.id).values(amount=ResourceOrm.amount + amount)
+        )
+        session.execute(
+            update(ClientBalanceOrm).where(ClientBalanceOrm.id == client_db.id)
+            .values(balance=ClientBalanceOrm.balance + earned)
+        )
+        LedgerRepository.append(session, "deposit", player=player, resource=resource,
+                                client_delta=earned, bank_delta=-earned, resource_delta=amount)
+        MarketStateRepository.bump(session)
+        return TradeResultSchema(player=player, resource=resource, amount=amount, money=earned)
+
+    @classmethod
+    def apply_withdraw(cls, session: Session, player: str, resource: str, amount: int) -> TradeResultSchema:
+        client_db, resource_db, bank_account = cls._lock(session, player, resource)
+        if resource_db.amount < amount:
+            raise TradeError("Недостаточно ресурса в банке")
+        total_dollars = int(MarketService.read(session))
+        cost = ResourceCalculator.calc_withdraw_cost(resource_db.name, resource_db.amount, amount, total_dollars)
+        ret = session.execute(
+            update(ClientBalanceOrm)
+            .where(ClientBalanceOrm.id == client_db.id, ClientBalanceOrm.balance >= cost)
+            .values(balance=ClientBalanceOrm.balance - cost)
+        )
+        if ret.rowcount == 0:
+            raise TradeError("Недостаточно $ на счёте")
+        ret = session.execute(
+            update(ResourceOrm)
+            .where(ResourceOrm.id == resource_db.id, ResourceOrm.amount >= amount)
+            .values(amount=ResourceOrm.amount - amount)
+        )
+        if ret.rowcount == 0:
+            raise TradeError("Недостаточно ресурса в банке")
+        # Добавляем деньги на банковский счет
+        session.execute(
+            update(BankAccountOrm).where(BankAccountOrm.id == bank_account.id)
+            .values(balance=BankAccountOrm.balance + cost)
+        )
+        LedgerRepository.append(session, "withdraw", player=player, resource=resource,
+                                client_delta=-cost, bank_delta=cost, resource_delta=-amount)
+        MarketStateRepository.bump(session)
+        return TradeResultSchema(player=player, resource=resource, amount=amount, money=cost)
+
+    @staticmethod
+    def _lock(session: Session, player: str, resource: str) -> tuple[ClientBalanceOrm, ResourceOrm, BankAccountOrm]:
+        client_db = session.scalar(select(ClientBalanceOrm).filter_by(name=player).with_for_update())
+        resource_db = session.scalar(select(ResourceOrm).filter_by(name=resource).with_for_update())
+        if not client_db or not resource_db:
+            raise TradeNotFoundError("Клиент или ресурс не найден")
+        return client_db, resource_db, BankAccountRepository.load(session)
+
+
+class AsyncTradeService:
+    """Асинхронная обертка: та же сделка в одной транзакции AsyncSession"""
+
+    @classmethod
+    async def deposit(cls, player: str, resource: str, amount: int) -> TradeResultSchema:
+        async with Async_session_maker() as session:
+            await begin_write_async(session)
+            result = await session.run_sync(TradeService.apply_deposit, player, resource, amount)
+            await session.commit()
+            return result
+
+    @classmethod
+    async def withdraw(cls, player: str, resource: str, amount: int) -> TradeResultSchema:
+        async with Async_session_maker() as session:
+            await begin_write_async(session)
+            result = await session.run_sync(TradeService.apply_withdraw, player, resource, amount)
+            await session.commit()
+            return result
+
+    @classmethod
+    async def batch(cls, trades: list[TradeRequestSchema]) -> list[TradeResultSchema]:
+        async with Async_session_maker() as session:
+            await begin_write_async(session)
+            results = await session.run_sync(TradeService.apply_batch, trades)
+            await session.commit()
+            return results
@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from src.config import settings
+from src.user.schemas import UserSchema
+
+
+class TokenCache:
+    """
+    Ограниченный кэш token -> пользователь с TTL и вытеснением давно неиспользуемых (LRU).
+    Кэш свой у каждого воркера: invalidate_user сбрасывает записи только в текущем процессе,
+    в остальных смена токена или роли видна не позже чем через ttl.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Растет при каждом сбросе: put с поколением до сброса не вернет в кэш устаревшего пользователя
+        self.generation = 0
+        self._items: OrderedDict[str, tuple[float, UserSchema]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str) -> UserSchema | None:
+        with self._lock:
+            item = self._items.get(token)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._items[token]
+                self.misses += 1
+                return None
+            self._items.move_to_end(token)
+            self.hits += 1
+            return item[1]
+
+    def put(self, token: str, user: UserSchema, generation: int | None = None) -> None:
+        """generation берется до чтения пользователя из БД"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._items[token] = (time.monotonic() + self.ttl, user)
+            self._items.move_to_end(token)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает все токены пользователя (смена токена, роли или пароля)"""
+        with self._lock:
+            self.generation += 1
+            for token in [token for token, (_, user) in self._items.items() if user.id == user_id]:
+                del self._items[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_cache = TokenCache(max_size=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
@@ -9,8 +9,8 @@ class UserOrm(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    login: Mapped[str]
+    login: Mapped[str] = mapped_column(index=True)
     password: Mapped[str]
-    auth_token: Mapped[str] = mapped_column(nullable=True)
+    auth_token: Mapped[str] = mapped_column(nullable=True, index=True)
     role: Mapped[str] = mapped_column(SqlEnum(UserStatus, name="user_status"))
 
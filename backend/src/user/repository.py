@@ -1,7 +1,7 @@
 from sqlalchemy import select, update
 
 from src.user.models import UserOrm
-from src.db import Session_maker
+from src.db import Session_maker, Async_session_maker
 
 class UserRepository:
 
@@ -36,3 +36,36 @@ class UserRepository:
             session.commit()
             return ret.rowcount
 
+
+class AsyncUserRepository:
+
+    @classmethod
+    async def add(cls, value: dict) -> UserOrm:
+        async with Async_session_maker() as session:
+            new_user = UserOrm(**value)
+            session.add(new_user)
+            await session.commit()
+            await session.refresh(new_user)
+            return new_user
+
+    @classmethod
+    async def find(cls, filter_by: dict) -> UserOrm:
+        async with Async_session_maker() as session:
+            query = select(UserOrm).filter_by(**filter_by)
+            result = await session.scalar(query)
+            return result
+
+    @classmethod
+    async def all(cls) -> list[UserOrm]:
+        async with Async_session_maker() as session:
+            query = select(UserOrm)
+            result = await session.scalars(query)
+            return result.all()
+
+    @classmethod
+    async def update(cls, user_id: int, value: dict) -> int:
+        async with Async_session_maker() as session:
+            query = update(UserOrm).where(UserOrm.id == user_id).values(**value)
+            ret = await session.execute(query)
+            await session.commit()
+            return ret.rowcount
@@ -1,5 +1,6 @@
 from src.func.filter_by import filter_by
-from src.user.repository import UserRepository
+from src.user.cache import token_cache
+from src.user.repository import UserRepository, AsyncUserRepository
 from src.user.schemas import UserSchema, UserUpdateSchema, UserFilterSchema, UserRegisterSchema, UserLoginSchema
 
 
@@ -29,4 +30,37 @@ class UserService:
     def update(cls, update_data: UserUpdateSchema) -> int:
         value = filter_by(update_data)
         row_count = UserRepository.update(update_data.id, value)
+        # Старый токен и закэшированная роль больше не действительны
+        token_cache.invalidate_user(update_data.id)
+        return row_count
+
+
+class AsyncUserService:
+
+    @classmethod
+    async def add(cls, new_user: UserRegisterSchema) -> UserSchema:
+        value: dict = new_user.model_dump()
+        db_user = await AsyncUserRepository.add(value)
+        return UserSchema.model_validate(db_user)
+
+    @classmethod
+    async def find(cls, filter_data: UserFilterSchema | UserLoginSchema) -> UserSchema | None:
+        value = filter_by(filter_data)
+        db_user = await AsyncUserRepository.find(value)
+
+        if db_user is not None:
+            return UserSchema.model_validate(db_user)
+
+        return None
+
+    @classmethod
+    async def all(cls) -> list[UserSchema]:
+        return [UserSchema.model_validate(elem) for elem in await AsyncUserRepository.all()]
+
+    @classmethod
+    async def update(cls, update_data: UserUpdateSchema) -> int:
+        value = filter_by(update_data)
+        row_count = await AsyncUserRepository.update(update_data.id, value)
+        # Старый токен и закэшированная роль больше не действительны
+        token_cache.invalidate_user(update_data.id)
         return row_count
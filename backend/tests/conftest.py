@@ -0,0 +1,69 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+# База тестов задается до импорта src: движки создаются при импорте src.db
+os.environ["DB_NAME"] = "pytest_market"
+os.environ["QUERY_BUDGET_TRACE"] = "true"
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DB_FILES = [BACKEND_DIR / f"pytest_market.db{suffix}" for suffix in ("", "-wal", "-shm")]
+
+
+def _remove_db() -> None:
+    for path in DB_FILES:
+        path.unlink(missing_ok=True)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    _remove_db()
+    from src.main import app  # Регистрирует все модели в Base.metadata
+    yield app
+    from src.db import engine, async_engine
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+    _remove_db()
+
+
+@pytest.fixture
+def market(database):
+    """Пустая база со схемой последней версии и начальными данными populate_db"""
+    from src.db import delete_tables
+    from src.migrations import migrate
+    from src.populate_db import main as populate_db
+    from src.resources.cache import market_cache
+    from src.resources.calc import ResourceCalculator
+    from src.resources.feed import price_feed
+    from src.user.cache import token_cache
+
+    delete_tables()
+    migrate()
+    populate_db()
+    # Кэши процесса держат состояние прошлой базы
+    ResourceCalculator.rates_version = None
+    token_cache.clear()
+    market_cache.clear()
+    price_feed.clear()
+    return database
+
+
+@pytest.fixture
+def run_async(database):
+    """
+    Выполняет корутину в новом цикле событий и возвращает ее результат.
+    Соединения aiosqlite привязаны к циклу, поэтому пул асинхронного движка закрывается в том же цикле.
+    """
+    from src.db import async_engine
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
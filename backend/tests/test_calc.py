@@ -0,0 +1,141 @@
+import math
+import random
+from itertools import accumulate
+
+import pytest
+
+from src.resources.calc import DIRECT_SUM_LIMIT, HARMONIC_TABLE_SIZE, ResourceCalculator
+
+TOTAL_DOLLARS = 123456.0
+STOCKS = [0, 1, 7, DIRECT_SUM_LIMIT, DIRECT_SUM_LIMIT + 1, 1000,
+          HARMONIC_TABLE_SIZE - 1, HARMONIC_TABLE_SIZE, HARMONIC_TABLE_SIZE + 1, 70000, 250000]
+AMOUNTS = [0, 1, DIRECT_SUM_LIMIT - 1, DIRECT_SUM_LIMIT, DIRECT_SUM_LIMIT + 1, 500, 20000]
+
+
+@pytest.fixture(autouse=True)
+def base_rates(monkeypatch):
+    monkeypatch.setattr(ResourceCalculator, "BASE_RATES", dict(ResourceCalculator.DEFAULT_BASE_RATES))
+
+
+def loop_withdraw_cost(resource_name: str, current_amount: int, withdraw_amount: int, total_dollars: float) -> float:
+    """Исходный O(n) расчет: сумма цен каждой снимаемой единицы"""
+    price = ResourceCalculator.get_resource_price
+    return math.fsum(price(resource_name, current_amount - i, total_dollars) for i in range(withdraw_amount))
+
+
+def _check(resource_name: str, stock: int, amount: int) -> None:
+    expected = loop_withdraw_cost(resource_name, stock, amount, TOTAL_DOLLARS)
+    actual = ResourceCalculator.calc_withdraw_cost(resource_name, stock, amount, TOTAL_DOLLARS)
+    assert actual == pytest.approx(expected, rel=1e-9, abs=0)
+
+
+@pytest.mark.parametrize("amount", AMOUNTS)
+@pytest.mark.parametrize("stock", STOCKS)
+def test_withdraw_cost_matches_loop(stock, amount):
+    _check("Лазурит", stock, amount)
+
+
+@pytest.mark.parametrize("stock, amount", [
+    # Снятие всего запаса и сверх него: знаменатель упирается в 1
+    (40, 40), (40, 45), (HARMONIC_TABLE_SIZE, HARMONIC_TABLE_SIZE), (5, DIRECT_SUM_LIMIT + 8),
+    # Остаток внутри таблицы, запас за её пределами
+    (HARMONIC_TABLE_SIZE + 5000, 10000),
+    # Оба конца за пределами таблицы (ветка с log1p)
+    (300000, 1000), (1 << 20, 100000), (1 << 20, 1 << 20),
+])
+def test_withdraw_cost_matches_loop_at_edges(stock, amount):
+    _check("Алмаз", stock, amount)
+
+
+@pytest.mark.parametrize("resource_name", list(ResourceCalculator.DEFAULT_BASE_RATES))
+def test_withdraw_cost_uses_resource_rate(resource_name):
+    _check(resource_name, 1000, DIRECT_SUM_LIMIT + 100)
+
+
+def test_direct_sum_limit_is_exact():
+    for amount in range(1, DIRECT_SUM_LIMIT + 1):
+        cost = 0
+        for i in range(amount):
+            cost += ResourceCalculator.get_resource_price("Редстоун", 837 - i, TOTAL_DOLLARS)
+        assert ResourceCalculator.calc_withdraw_cost("Редстоун", 837, amount, TOTAL_DOLLARS) == cost
+
+
+def old_withdraw_amount_for_money(resource_name: str, current_amount: int, available_money: float,
+                                  total_dollars: float) -> int:
+    """Исходный перебор n до первой неподъемной стоимости (стоимость n единиц - поэлементная сумма)"""
+    price = ResourceCalculator.get_resource_price
+    # Накопленные суммы в том же порядке сложения, что и цикл, пересчитывавший стоимость на каждом шаге
+    prefix = list(accumulate((price(resource_name, current_amount - i, total_dollars)
+                              for i in range(min(current_amount, ResourceCalculator.AMOUNT_SEARCH_LIMIT) + 1)),
+                             initial=0))
+    n = 0
+    while True:
+        n += 1
+        if n > current_amount or n > ResourceCalculator.AMOUNT_SEARCH_LIMIT or prefix[n] > available_money:
+            return n - 1
+
+
+def old_deposit_amount_for_money(resource_name: str, current_amount: int, target_money: float,
+                                 total_dollars: float) -> int:
+    n = 0
+    money = 0
+    while money < target_money:
+        n += 1
+        money = ResourceCalculator.calc_deposit_earned(resource_name, current_amount, n, total_dollars)
+        if n > ResourceCalculator.AMOUNT_SEARCH_LIMIT:
+            break
+    return n
+
+
+def boundary_amounts(costs: list[float]) -> list[float]:
+    """Суммы ровно на стоимости каждого количества и на соседних числах с плавающей точкой"""
+    return [value for cost in costs for value in (math.nextafter(cost, -math.inf), cost, math.nextafter(cost, math.inf))]
+
+
+@pytest.mark.parametrize("stock", [1, 5, DIRECT_SUM_LIMIT, DIRECT_SUM_LIMIT + 1, 100, 837, 5000])
+def test_withdraw_amount_for_money_matches_old_loop(stock):
+    price = ResourceCalculator.get_resource_price
+    costs = list(accumulate(price("Лазурит", stock - i, TOTAL_DOLLARS) for i in range(stock)))
+    rng = random.Random(stock)
+    picked = costs if stock <= 100 else rng.sample(costs, 100) + costs[-3:]
+    for available_money in [-1.0, 0.0, *boundary_amounts(picked), costs[-1] * 2]:
+        n, cost = ResourceCalculator.calc_withdraw_amount_for_money("Лазурит", stock, available_money, TOTAL_DOLLARS)
+        assert n == old_withdraw_amount_for_money("Лазурит", stock, available_money, TOTAL_DOLLARS), available_money
+        assert cost == pytest.approx(ResourceCalculator.calc_withdraw_cost("Лазурит", stock, n, TOTAL_DOLLARS))
+
+
+@pytest.mark.parametrize("stock", [0, 1, 9, 837])
+def test_deposit_amount_for_money_matches_old_loop(stock):
+    earned = [ResourceCalculator.calc_deposit_earned("Незеритовый слиток", stock, n, TOTAL_DOLLARS)
+              for n in range(1, 300, 7)]
+    for target_money in [-1.0, 0.0, *boundary_amounts(earned)]:
+        n, _ = ResourceCalculator.calc_deposit_amount_for_money(
+            "Незеритовый слиток", stock, target_money, TOTAL_DOLLARS
+        )
+        assert n == old_deposit_amount_for_money("Незеритовый слиток", stock, target_money, TOTAL_DOLLARS)
+
+
+GRID_STOCKS = [0, 1, 9, DIRECT_SUM_LIMIT + 1, 837, HARMONIC_TABLE_SIZE + 1]
+GRID_QUANTITIES = [0, 1, 8, DIRECT_SUM_LIMIT, DIRECT_SUM_LIMIT + 1, 64, 576, 1000]
+
+
+@pytest.mark.parametrize("stock", GRID_STOCKS)
+def test_quote_grid_matches_scalar_quotes(stock):
+    stocks = {name: stock for name in ResourceCalculator.DEFAULT_BASE_RATES}
+    grid = ResourceCalculator.quote_grid(stocks, GRID_QUANTITIES, TOTAL_DOLLARS)
+
+    assert grid.keys() == stocks.keys()
+    for name, row in grid.items():
+        for q, earned, cost in zip(GRID_QUANTITIES, row["deposit"], row["withdraw"], strict=True):
+            assert earned == pytest.approx(
+                ResourceCalculator.calc_deposit_earned(name, stock, q, TOTAL_DOLLARS), rel=1e-12, abs=0
+            )
+            assert cost == ResourceCalculator.calc_withdraw_cost(name, stock, q, TOTAL_DOLLARS)
+            if q == 0:
+                continue
+            # Обратные котировки по значению ячейки: депозит возвращает то же количество, снятие - то же,
+            # что исходный перебор (формула для больших количеств может быть на ulp ниже поэлементной суммы)
+            assert ResourceCalculator.calc_deposit_amount_for_money(name, stock, earned, TOTAL_DOLLARS)[0] == q
+            n, _ = ResourceCalculator.calc_withdraw_amount_for_money(name, stock, cost, TOTAL_DOLLARS)
+            assert n == old_withdraw_amount_for_money(name, stock, cost, TOTAL_DOLLARS)
+            assert min(q, stock) - 1 <= n <= min(q, stock)
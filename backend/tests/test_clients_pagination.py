@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.clients.schemas import ClientBalanceSchema
+from src.clients.service import ClientBalanceService
+
+# После sunny и dima из populate_db
+NEW_CLIENTS = ["alex", "steve", "alice", "bob", "stan"]
+
+
+@pytest.fixture
+def client(market):
+    for name in NEW_CLIENTS:
+        ClientBalanceService.add(ClientBalanceSchema(name=name, balance=10))
+    return TestClient(market)
+
+
+def walk(client, **params) -> list[str]:
+    """Имена со всех страниц по next_cursor"""
+    names, cursor = [], None
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor is not None else {})}
+        body = client.get("/api/clients/balances", params=query).json()
+        assert len(body["clients"]) <= params["limit"]
+        names.extend(item["name"] for item in body["clients"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return names
+
+
+def test_pages_by_id_follow_insertion_order(client):
+    assert walk(client, limit=2, sort="id") == ["sunny", "dima", *NEW_CLIENTS]
+
+
+def test_pages_by_name_are_sorted(client):
+    assert walk(client, limit=3, sort="name") == sorted(["sunny", "dima", *NEW_CLIENTS])
+
+
+def test_prefix_filter(client):
+    assert walk(client, limit=1, sort="name", prefix="st") == ["stan", "steve"]
+    assert walk(client, limit=10, sort="id", prefix="al") == ["alex", "alice"]
+
+
+def test_without_limit_returns_everyone(client):
+    body = client.get("/api/clients/balances").json()
+    assert len(body["clients"]) == 2 + len(NEW_CLIENTS)
+    assert body["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["abc", "-1", "1.5", "²", "١٢"])
+def test_bad_id_cursor_is_rejected(client, cursor):
+    response = client.get("/api/clients/balances", params={"limit": 2, "sort": "id", "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_bad_limit_is_rejected(client):
+    assert client.get("/api/clients/balances", params={"limit": 0}).status_code == 400
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, text
+
+from src.db import engine
+from src.resources.models import ResourcePriceCandleOrm, ResourcePriceHistoryOrm
+from src.user.models import UserOrm
+
+QUERIES = {
+    "token": select(UserOrm).filter_by(auth_token="token"),
+    "login": select(UserOrm).filter_by(login="root"),
+    "history": select(ResourcePriceHistoryOrm).filter_by(resource_name="Алмаз")
+        .order_by(ResourcePriceHistoryOrm.timestamp.desc()).limit(20),
+    "candles": select(ResourcePriceCandleOrm).filter_by(resource_name="Алмаз", interval="1m")
+        .where(ResourcePriceCandleOrm.bucket_start >= datetime(2024, 1, 1))
+        .order_by(ResourcePriceCandleOrm.bucket_start).limit(500),
+    # Пачка минутных свечей на удаление при хранении
+    "candle_retention": select(ResourcePriceCandleOrm.id).filter_by(interval="1m")
+        .where(ResourcePriceCandleOrm.bucket_start < datetime(2024, 1, 1))
+        .order_by(ResourcePriceCandleOrm.bucket_start).limit(5000),
+}
+
+
+def query_plan(query) -> list[str]:
+    sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        return [row.detail for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_lookup_uses_index(market, name):
+    plan = query_plan(QUERIES[name])
+    assert plan and all(detail.startswith("SEARCH") and "INDEX" in detail for detail in plan), plan
+    # Ни полного просмотра таблицы, ни сортировки во временном B-дереве
+    assert not any("SCAN" in detail or "TEMP B-TREE" in detail for detail in plan), plan
@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.resources.repository import MarketStateRepository
+
+
+@pytest.fixture
+def client(market):
+    client = TestClient(market)
+    token = client.post("/api/auth/login", json={"login": "root", "password": "root"}).json()["token"]
+    client.headers["X-Auth-Token"] = token
+    return client
+
+
+@pytest.mark.parametrize("path", ["/api/resources/prices", "/api/resources/Алмаз/history"])
+def test_matching_etag_returns_304(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    cached = client.get(path, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+
+def test_trade_changes_etag_in_its_own_transaction(client):
+    first = client.get("/api/resources/prices")
+    etag = first.headers["ETag"]
+    version = MarketStateRepository.get().version
+
+    response = client.post("/api/admin/deposit", json={"player": "sunny", "resource": "Алмаз", "amount": 10})
+    assert response.status_code == 200
+
+    after = client.get("/api/resources/prices", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    amounts = {res["name"]: res["amount"] for res in after.json()["resources"]}
+    assert amounts["Алмаз"] == 137
+    # Версию поднимает сама сделка и запись снимка истории, отдельной транзакции сброса кэша нет
+    assert MarketStateRepository.get().version == version + 2
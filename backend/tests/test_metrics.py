@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.metrics.registry import Counter, Histogram
+
+THREADS = 8
+PER_THREAD = 20000
+
+
+def test_counter_and_histogram_survive_concurrent_writers():
+    counter = Counter("test_total", "Тест", ("route",))
+    histogram = Histogram("test_seconds", "Тест")
+
+    def write(_):
+        for i in range(PER_THREAD):
+            counter.inc(("a",))
+            histogram.observe(0.001 * (i % 7))
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(write, range(THREADS)))
+
+    assert counter.values[("a",)] == THREADS * PER_THREAD
+    counts, total = histogram.values[()]
+    assert sum(counts) == THREADS * PER_THREAD
+    assert histogram.render()[-1] == f"test_seconds_count {THREADS * PER_THREAD}"
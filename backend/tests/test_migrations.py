@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, inspect, select, text
+
+from src.clients.service import MoneySupplyService
+from src.db import Base, delete_tables, engine
+from src.ledger.models import LedgerEntryOrm
+from src.ledger.service import LedgerService
+from src.migrations import BASELINE_DDL, LATEST_VERSION, MIGRATIONS, migrate
+from src.resources.calc import ResourceCalculator
+from src.resources.models import ResourceOrm, ResourcePriceCandleOrm
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+@pytest.fixture
+def baseline_db(database):
+    """База в исходной схеме (до миграций) с данными, записанными мимо журнала"""
+    delete_tables()
+    with engine.begin() as conn:
+        for statement in BASELINE_DDL:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO bank_account (id, balance) VALUES (1, 50000)"))
+        conn.execute(text("INSERT INTO client_balances (name, balance) VALUES ('sunny', 8), ('dima', 0)"))
+        conn.execute(text("INSERT INTO resources (name, amount) VALUES ('Алмаз', 127), ('Лазурит', 693)"))
+        conn.execute(text("INSERT INTO users (login, password, role) VALUES ('root', 'root', 'admin')"))
+        for minute in range(3):
+            conn.execute(
+                text("INSERT INTO resource_price_history (resource_name, price, timestamp) VALUES ('Алмаз', :p, :t)"),
+                {"p": 10.0 + minute, "t": START + timedelta(minutes=minute)},
+            )
+    yield
+    delete_tables()
+
+
+def schema() -> dict:
+    inspector = inspect(engine)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"] for index in inspector.get_indexes(table)},
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+def test_baseline_database_migrates_to_models_schema(baseline_db):
+    assert migrate() == [number for number, _, _ in MIGRATIONS]
+
+    expected = {
+        table.name: ({column.name for column in table.columns}, {index.name for index in table.indexes})
+        for table in Base.metadata.sorted_tables
+    }
+    assert schema() == expected
+
+    with engine.connect() as conn:
+        rates = dict(conn.execute(select(ResourceOrm.name, ResourceOrm.base_rate)).tuples().all())
+        assert rates["Алмаз"] == ResourceCalculator.DEFAULT_BASE_RATES["Алмаз"]
+        # Балансы, записанные мимо журнала, становятся записями opening
+        assert conn.scalar(select(func.count()).select_from(LedgerEntryOrm)) == 5
+        assert conn.scalar(select(ResourcePriceCandleOrm.count).filter_by(interval="1h")) == 3
+    assert MoneySupplyService.total() == pytest.approx(50008)
+    assert LedgerService.verify()["ok"]
+
+
+def test_migrate_is_noop_at_latest_version(baseline_db):
+    migrate()
+    before = schema()
+
+    assert migrate() == []
+    assert migrate() == []
+    assert schema() == before
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT max(version) FROM schema_version")) == LATEST_VERSION
+        assert conn.scalar(select(func.count()).select_from(LedgerEntryOrm)) == 5
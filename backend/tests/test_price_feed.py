@@ -0,0 +1,46 @@
+import asyncio
+import json
+from datetime import datetime
+
+from src.db import Session_maker
+from src.resources.feed import PriceFeed
+from src.resources.repository import MarketStateRepository
+from src.resources.service import AsyncResourceService, ResourceService
+
+
+def change_in_other_worker() -> None:
+    """Изменение рынка, сделанное другим процессом: только БД, без публикации в этот PriceFeed"""
+    ResourceService.update(ResourceService.find_db("Алмаз").id, 500)
+    with Session_maker() as session:
+        MarketStateRepository.bump(session)
+        session.commit()
+
+
+def frame_amounts(frame: bytes) -> dict[str, int]:
+    payload = json.loads(frame.decode().split("data: ", 1)[1])
+    return {res["name"]: res["amount"] for res in payload["resources"]}
+
+
+def test_stream_picks_up_changes_from_other_workers(market, run_async):
+    feed = PriceFeed(poll_seconds=0.05)
+
+    async def scenario() -> list[bytes]:
+        stream = feed.subscribe()
+        try:
+            prices = await AsyncResourceService.prices()
+            feed.publish([res.model_dump() for res in prices], datetime.now())
+            frames = [await anext(stream)]
+            # Опрос без изменений не рассылает повторный кадр
+            await asyncio.sleep(0.2)
+            await asyncio.to_thread(change_in_other_worker)
+            frames.append(await asyncio.wait_for(anext(stream), timeout=2))
+            return frames
+        finally:
+            await stream.aclose()
+            await feed.stop()
+
+    first, second = run_async(scenario())
+
+    assert frame_amounts(first)["Алмаз"] == 127
+    assert frame_amounts(second)["Алмаз"] == 500
+    assert feed.published == 2
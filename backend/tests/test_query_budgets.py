@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.resources import stream_resource_prices
+from src.config import settings
+from src.metrics.budget import ROUTE_QUERY_BUDGETS, QueryBudget
+from src.resources.calc import ResourceCalculator
+from src.resources.snapshots import snapshot_writer
+from src.user.cache import token_cache
+
+TRADE = {"player": "sunny", "resource": "Редстоун", "amount": 1}
+CALC = {"resource": "Алмаз", "add_amount": 3, "target_money": 10, "withdraw_amount": 3, "available_money": 10}
+
+
+async def first_stream_frame() -> bytes:
+    response = await stream_resource_prices()
+    try:
+        return await anext(response.body_iterator)
+    finally:
+        await response.body_iterator.aclose()
+
+
+# Запрос к каждому маршруту из таблицы бюджетов: (client, admin headers) -> response
+ROUTE_REQUESTS = {
+    ("GET", "/api/resources/prices"): lambda c, h: c.get("/api/resources/prices"),
+    ("GET", "/api/resources/stream"): lambda c, h: c.portal.call(first_stream_frame),
+    ("GET", "/api/resources/history/export"): lambda c, h: c.get("/api/resources/history/export?format=csv"),
+    ("GET", "/api/resources/{resource}/history"): lambda c, h: c.get("/api/resources/Алмаз/history"),
+    ("GET", "/api/resources/{resource}/candles"): lambda c, h: c.get("/api/resources/Алмаз/candles?interval=1m"),
+    ("POST", "/api/resources/public/deposit/earned"):
+        lambda c, h: c.post("/api/resources/public/deposit/earned", json=CALC),
+    ("POST", "/api/resources/public/deposit/amount-for-money"):
+        lambda c, h: c.post("/api/resources/public/deposit/amount-for-money", json=CALC),
+    ("POST", "/api/resources/public/withdraw/cost"):
+        lambda c, h: c.post("/api/resources/public/withdraw/cost", json=CALC),
+    ("POST", "/api/resources/public/withdraw/amount-for-money"):
+        lambda c, h: c.post("/api/resources/public/withdraw/amount-for-money", json=CALC),
+    ("POST", "/api/resources/public/quotes"):
+        lambda c, h: c.post("/api/resources/public/quotes", json={"quantities": [1, 10, 100]}),
+    ("GET", "/api/clients/balances"): lambda c, h: c.get("/api/clients/balances"),
+    ("POST", "/api/clients/register"): lambda c, h: c.post("/api/clients/register", json={"name": "steve"}),
+    ("POST", "/api/auth/login"): lambda c, h: c.post("/api/auth/login", json={"login": "root", "password": "root"}),
+    ("POST", "/api/admin/deposit"): lambda c, h: c.post("/api/admin/deposit", json=TRADE, headers=h),
+    ("POST", "/api/admin/withdraw"): lambda c, h: c.post("/api/admin/withdraw", json=TRADE, headers=h),
+    ("POST", "/api/admin/trades/batch"):
+        lambda c, h: c.post("/api/admin/trades/batch", json={"trades": [{**TRADE, "kind": "deposit"}] * 3}, headers=h),
+    ("POST", "/api/admin/update-balance"):
+        lambda c, h: c.post("/api/admin/update-balance", json={"player": "sunny", "new_balance": 100}, headers=h),
+    ("POST", "/api/admin/update-bank-balance"):
+        lambda c, h: c.post("/api/admin/update-bank-balance", json={"new_balance": 50000}, headers=h),
+    ("POST", "/api/admin/update-resource-amount"):
+        lambda c, h: c.post("/api/admin/update-resource-amount", json={"resource": "Алмаз", "new_amount": 200},
+                            headers=h),
+    ("POST", "/api/admin/update-base-rate"):
+        lambda c, h: c.post("/api/admin/update-base-rate", json={"resource": "Алмаз", "new_rate": 2}, headers=h),
+    ("POST", "/api/admin/add-resource"):
+        lambda c, h: c.post("/api/admin/add-resource", json={"name": "Изумруд", "amount": 50, "base_rate": 4},
+                            headers=h),
+    ("DELETE", "/api/admin/delete-resource"):
+        lambda c, h: c.request("DELETE", "/api/admin/delete-resource", json={"resource": "Лазурит"}, headers=h),
+    ("GET", "/api/admin/bank-balance"): lambda c, h: c.get("/api/admin/bank-balance", headers=h),
+    ("GET", "/api/admin/ledger/verify"): lambda c, h: c.get("/api/admin/ledger/verify", headers=h),
+    ("POST", "/api/admin/ledger/snapshot"): lambda c, h: c.post("/api/admin/ledger/snapshot", headers=h),
+}
+
+
+@pytest.fixture
+def client(market, monkeypatch):
+    # Без фоновых задач; снимок истории цен пишется в самом запросе, как в таблице бюджетов
+    monkeypatch.setattr(settings, "COMPACTION_ENABLED", False)
+    monkeypatch.setattr(settings, "LEDGER_SNAPSHOT_ENABLED", False)
+    monkeypatch.setattr(snapshot_writer, "coalesce_seconds", 0)
+    with TestClient(market) as client:
+        yield client
+
+
+def test_every_budgeted_route_is_exercised():
+    assert set(ROUTE_REQUESTS) == set(ROUTE_QUERY_BUDGETS)
+
+
+@pytest.mark.parametrize("route", list(ROUTE_QUERY_BUDGETS), ids=" ".join)
+def test_route_within_query_budget(client, route):
+    token = client.post("/api/auth/login", json={"login": "root", "password": "root"}).json()["token"]
+    headers = {"X-Auth-Token": token}
+    # Холодный путь: промах кэша токенов и перечитывание курсов
+    token_cache.clear()
+    ResourceCalculator.rates_version = None
+    queries, sessions = ROUTE_QUERY_BUDGETS[route]
+    with QueryBudget(queries, sessions):
+        response = ROUTE_REQUESTS[route](client, headers)
+    if isinstance(response, bytes):
+        assert response.startswith(b"event: prices")
+    else:
+        assert response.status_code == 200, response.text
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from src.db import Session_maker, engine
+from src.resources.models import ResourcePriceCandleOrm, ResourcePriceHistoryOrm
+from src.resources.repository import ResourceRepository
+from src.resources.retention import compact_history
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+def add_raw_history(points: list[tuple[datetime, float]]) -> None:
+    """Точки истории, записанные до появления свечей"""
+    with Session_maker() as session:
+        session.add_all(ResourcePriceHistoryOrm(resource_name="Алмаз", price=price, timestamp=timestamp)
+                        for timestamp, price in points)
+        session.commit()
+
+
+def candle(interval: str, bucket_start: datetime) -> ResourcePriceCandleOrm | None:
+    with Session_maker() as session:
+        return session.scalar(select(ResourcePriceCandleOrm).filter_by(
+            resource_name="Алмаз", interval=interval, bucket_start=bucket_start
+        ))
+
+
+def clear_history() -> None:
+    with Session_maker() as session:
+        session.execute(delete(ResourcePriceHistoryOrm))
+        session.execute(delete(ResourcePriceCandleOrm))
+        session.commit()
+
+
+def test_backfill_merges_pre_candle_points_into_existing_candle(market):
+    clear_history()
+    add_raw_history([(START + timedelta(minutes=1), 5.0), (START + timedelta(minutes=2), 50.0),
+                     (START + timedelta(minutes=3), 1.0)])
+    # Свечи появились: снимки того же часа пишут историю и дополняют свечи
+    ResourceRepository.add_price_snapshot({"Алмаз": 10.0}, START + timedelta(minutes=30))
+    ResourceRepository.add_price_snapshot({"Алмаз": 20.0}, START + timedelta(minutes=40))
+
+    for _ in range(2):  # Миграция идемпотентна
+        with engine.begin() as conn:
+            ResourceRepository.backfill_candles(conn)
+        hour = candle("1h", START)
+        assert (hour.open, hour.high, hour.low, hour.close, hour.count) == (5.0, 50.0, 1.0, 20.0, 5)
+        day = candle("1d", datetime(2024, 3, 1))
+        assert (day.open, day.high, day.low, day.close, day.count) == (5.0, 50.0, 1.0, 20.0, 5)
+        # Минутные бакеты без свечи сворачиваются целиком, со свечой - не трогаются
+        assert candle("1m", START + timedelta(minutes=2)).count == 1
+        assert candle("1m", START + timedelta(minutes=30)).count == 1
+
+
+def test_compaction_keeps_rollups_of_deleted_points(market, run_async):
+    clear_history()
+    for minute in range(0, 120, 10):
+        ResourceRepository.add_price_snapshot({"Алмаз": float(minute)}, START + timedelta(minutes=minute))
+    recent = START + timedelta(days=40)
+    ResourceRepository.add_price_snapshot({"Алмаз": 1.0}, recent)
+
+    report = run_async(compact_history(now=recent + timedelta(minutes=5)))
+
+    assert report["history_deleted"] == 12
+    assert report["candles_deleted"] == 12
+    with Session_maker() as session:
+        assert session.scalar(select(func.count()).select_from(ResourcePriceHistoryOrm)) == 1
+        intervals = dict(session.execute(
+            select(ResourcePriceCandleOrm.interval, func.count()).group_by(ResourcePriceCandleOrm.interval)
+        ).tuples().all())
+    assert intervals == {"1m": 1, "1h": 3, "1d": 2}
+    hour = candle("1h", START)
+    assert (hour.open, hour.high, hour.low, hour.close, hour.count) == (0.0, 50.0, 0.0, 50.0, 6)
@@ -0,0 +1,33 @@
+import asyncio
+
+from src.resources.service import AsyncResourceHistoryService
+from src.resources.snapshots import SnapshotWriter
+
+
+def test_stop_finishes_write_in_progress_and_pending_changes(market, monkeypatch, run_async):
+    write = AsyncResourceHistoryService.update_all_prices_history
+    completed = []
+
+    async def slow_write():
+        await asyncio.sleep(0.1)
+        await write()
+        completed.append(True)
+
+    monkeypatch.setattr(AsyncResourceHistoryService, "update_all_prices_history", slow_write)
+
+    async def scenario() -> SnapshotWriter:
+        writer = SnapshotWriter(coalesce_seconds=0.01)
+        writer.start()
+        await writer.schedule()
+        await asyncio.sleep(0.05)
+        # Изменение рынка во время записи снимка, сразу за ним - остановка приложения
+        await writer.schedule()
+        await writer.stop()
+        return writer
+
+    writer = run_async(scenario())
+
+    assert len(completed) == 2
+    assert writer.written == 2
+    assert writer.pending == 0
+    assert not writer.running
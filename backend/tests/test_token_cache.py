@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from src.api import auth
+from src.user.cache import TokenCache
+from src.user.enum.user_status import UserStatus
+from src.user.schemas import UserSchema
+
+USER = UserSchema(id=1, login="root", password="root", auth_token="old", role=UserStatus.admin)
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = TokenCache(max_size=8, ttl=60)
+    generation = cache.generation
+    cache.invalidate_user(USER.id)
+    cache.put("old", USER, generation)
+    assert cache.get("old") is None
+
+    cache.put("old", USER, cache.generation)
+    assert cache.get("old") == USER
+
+
+def test_entries_expire_after_ttl():
+    cache = TokenCache(max_size=8, ttl=0.05)
+    cache.put("old", USER, cache.generation)
+    assert cache.get("old") == USER
+    time.sleep(0.1)
+    assert cache.get("old") is None
+
+
+def test_least_recently_used_token_is_evicted():
+    cache = TokenCache(max_size=3, ttl=60)
+    users = {token: USER.model_copy(update={"id": i, "auth_token": token})
+             for i, token in enumerate(("a", "b", "c", "d"))}
+    for token in "abc":
+        cache.put(token, users[token], cache.generation)
+    # Чтение освежает "a": вытеснить должно "b", к которому дольше всех не обращались
+    assert cache.get("a") == users["a"]
+    cache.put("d", users["d"], cache.generation)
+
+    assert cache.get("b") is None
+    assert [cache.get(token) for token in "acd"] == [users[token] for token in "acd"]
+    assert cache.stats()["size"] == 3
+
+
+def test_lookup_racing_with_token_change_is_not_cached(monkeypatch):
+    cache = TokenCache(max_size=8, ttl=60)
+    monkeypatch.setattr(auth, "token_cache", cache)
+
+    async def find(filter_data):
+        # Токен меняют, пока запрос читает пользователя по старому токену
+        cache.invalidate_user(USER.id)
+        return USER
+
+    monkeypatch.setattr(auth.AsyncUserService, "find", find)
+
+    assert asyncio.run(auth.get_current_user("old")) == USER
+    assert cache.get("old") is None
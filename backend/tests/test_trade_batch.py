@@ -0,0 +1,76 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from src.clients.models import ClientBalanceOrm
+from src.clients.service import BankAccountService, ClientBalanceService
+from src.db import Session_maker
+from src.ledger.models import LedgerEntryOrm
+from src.resources.service import ResourceService
+from src.trade.schemas import TradeRequestSchema
+from src.trade.service import TradeError, TradeService
+
+
+def state() -> tuple:
+    with Session_maker() as session:
+        entries = session.scalar(select(func.count()).select_from(LedgerEntryOrm))
+    return (
+        {client.name: client.balance for client in ClientBalanceService.all()},
+        {resource.name: resource.amount for resource in ResourceService.all()},
+        BankAccountService.get().balance,
+        entries,
+    )
+
+
+def trade(kind: str, player: str, resource: str, amount: int) -> TradeRequestSchema:
+    return TradeRequestSchema(kind=kind, player=player, resource=resource, amount=amount)
+
+
+def test_batch_applies_every_trade(market):
+    ClientBalanceService.update(ClientBalanceService.find_db("sunny").id, 10_000)
+    trades = [trade("deposit", "dima", "Алмаз", 5), trade("withdraw", "dima", "Редстоун", 3),
+              trade("deposit", "sunny", "Лазурит", 40), trade("withdraw", "sunny", "Алмаз", 2)]
+    clients, stock, bank, entries = state()
+    results = TradeService.batch(trades)
+
+    for request, result in zip(trades, results):
+        sign = 1 if request.kind == "deposit" else -1
+        clients[request.player] += sign * result.money
+        bank -= sign * result.money
+        stock[request.resource] += sign * request.amount
+    clients_after, stock_after, bank_after, entries_after = state()
+    assert stock_after == stock
+    assert clients_after == pytest.approx(clients, rel=1e-12)
+    assert bank_after == pytest.approx(bank, rel=1e-12)
+    assert entries_after == entries + len(trades)
+
+
+def test_failing_trade_rolls_back_whole_batch(market):
+    before = state()
+    trades = [trade("deposit", "dima", "Алмаз", 5),
+              trade("withdraw", "dima", "Незеритовый слиток", 1000),  # Запаса не хватает
+              trade("deposit", "sunny", "Лазурит", 40)]
+    with pytest.raises(TradeError, match="#2"):
+        TradeService.batch(trades)
+    assert state() == before
+
+
+def test_overdraft_guard_in_sql_rolls_back(market):
+    client_id = ClientBalanceService.find_db("dima").id
+    before = state()
+    with Session_maker() as session:
+        with pytest.raises(TradeError):
+            TradeService._shift(session, ClientBalanceOrm.__table__.c.balance, ClientBalanceOrm.__table__.c.id,
+                                {client_id: -1_000_000})
+        session.rollback()
+    assert state() == before
+
+
+def test_empty_batch_is_rejected(market):
+    client = TestClient(market)
+    token = client.post("/api/auth/login", json={"login": "root", "password": "root"}).json()["token"]
+    before = state()
+    response = client.post("/api/admin/trades/batch", json={"trades": []}, headers={"X-Auth-Token": token})
+    assert response.status_code == 400
+    assert state() == before
+    assert TradeService.batch([]) == []
@@ -0,0 +1,118 @@
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.clients.service import BankAccountService, ClientBalanceService, MoneySupplyService
+from src.ledger.service import LedgerService
+from src.resources.service import ResourceService
+from src.trade.service import AsyncTradeService, TradeError, TradeService
+
+PLAYERS = ("sunny", "dima")
+RESOURCES = ("Алмаз", "Редстоун", "Золотой слиток")
+OPERATIONS = 200
+
+
+def _state() -> tuple[dict, dict, float]:
+    clients = {client.name: client.balance for client in ClientBalanceService.all()}
+    stock = {resource.name: resource.amount for resource in ResourceService.all()}
+    return clients, stock, BankAccountService.get().balance
+
+
+def _operations(seed: int) -> list[tuple[str, str, str, int]]:
+    rng = random.Random(seed)
+    return [
+        (rng.choice(("deposit", "withdraw")), rng.choice(PLAYERS), rng.choice(RESOURCES), rng.randint(1, 5))
+        for _ in range(OPERATIONS)
+    ]
+
+
+def _fund_players() -> None:
+    # Снятия не должны упираться в нулевой баланс клиента
+    for name in PLAYERS:
+        ClientBalanceService.update(ClientBalanceService.find_db(name).id, 1_000_000)
+
+
+def _assert_conserved(before, after, trades) -> None:
+    """Итог совпадает с последовательным применением всех прошедших сделок: ни одно обновление не потеряно"""
+    clients, stock, bank = before
+    expected_clients, expected_stock, expected_bank = dict(clients), dict(stock), bank
+    for kind, result in trades:
+        sign = 1 if kind == "deposit" else -1
+        expected_clients[result.player] += sign * result.money
+        expected_bank -= sign * result.money
+        expected_stock[result.resource] += sign * result.amount
+
+    clients_after, stock_after, bank_after = after
+    assert stock_after == expected_stock
+    assert clients_after == pytest.approx(expected_clients, rel=1e-9, abs=1e-6)
+    assert bank_after == pytest.approx(expected_bank, rel=1e-9, abs=1e-6)
+    # Сделки только переводят деньги между банком и клиентами
+    assert sum(clients_after.values()) + bank_after == pytest.approx(sum(clients.values()) + bank, rel=1e-9)
+    assert MoneySupplyService.total() == pytest.approx(sum(clients_after.values()) + bank_after, rel=1e-9)
+    assert LedgerService.verify()["ok"]
+
+
+def test_parallel_trades_in_threads_lose_no_updates(market):
+    _fund_players()
+    before = _state()
+
+    def run(operation):
+        kind, player, resource, amount = operation
+        trade = TradeService.deposit if kind == "deposit" else TradeService.withdraw
+        try:
+            return kind, trade(player, resource, amount)
+        except TradeError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        trades = [trade for trade in pool.map(run, _operations(seed=1)) if trade is not None]
+
+    assert len(trades) > OPERATIONS // 2
+    _assert_conserved(before, _state(), trades)
+
+
+def test_parallel_async_trades_lose_no_updates(market, run_async):
+    _fund_players()
+    before = _state()
+
+    async def run(operation):
+        kind, player, resource, amount = operation
+        trade = AsyncTradeService.deposit if kind == "deposit" else AsyncTradeService.withdraw
+        try:
+            return kind, await trade(player, resource, amount)
+        except TradeError:
+            return None
+
+    async def run_all():
+        return await asyncio.gather(*(run(operation) for operation in _operations(seed=2)))
+
+    trades = [trade for trade in run_async(run_all()) if trade is not None]
+
+    assert len(trades) > OPERATIONS // 2
+    _assert_conserved(before, _state(), trades)
+
+
+def test_parallel_bank_edits_keep_money_supply(market):
+    """Правки баланса банка вперемешку со сделками: дельты денежной массы и журнала не теряются"""
+    _fund_players()
+    operations = _operations(seed=3)
+
+    def run(index):
+        if index % 4 == 0:
+            return "edit", BankAccountService.update(500_000 + index)
+        kind, player, resource, amount = operations[index]
+        trade = TradeService.deposit if kind == "deposit" else TradeService.withdraw
+        try:
+            return kind, trade(player, resource, amount)
+        except TradeError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, range(OPERATIONS)))
+
+    assert [result for result in results if result and result[0] == "edit"] == [("edit", 1)] * (OPERATIONS // 4)
+    clients, _, bank = _state()
+    assert MoneySupplyService.total() == pytest.approx(sum(clients.values()) + bank, rel=1e-9)
+    assert LedgerService.verify()["ok"]